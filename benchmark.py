@@ -0,0 +1,207 @@
+"""
+Benchmark suite for the pipeline stages with a synthetic data generator.
+
+Generates training, ideal and test data of configurable size, runs every stage of the pipeline over a sweep
+of sizes and records wall time and, with --memory, peak memory per stage in a JSON file, e.g.:
+
+    python benchmark.py --rows 400 4000 --ideal 50 500 --test-rows 100 100000 --memory --output benchmark_results.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from calculation import Calculations
+
+STAGES = ['read_csv_to_sql', 'calculate_criteria1', 'deviations', 'results', 'dashboard']
+
+
+def generate_synthetic(n_rows=400, n_ideal=50, n_test=100, n_train=4, noise=0.5, off_grid=False, seed=0):
+    """
+    Generates training, ideal and test data shaped like train.csv, ideal.csv and test.csv.
+
+    The ideal functions are random mixes of a sine, a polynomial and an offset on an evenly spaced X grid.
+    Each training function is a randomly chosen ideal function plus Gaussian noise. Test points lie on a
+    randomly chosen ideal function plus noise, with a fifth of them moved far away so they do not match.
+
+    Parameters:
+        n_rows (int): Number of rows of the training and ideal data.
+        n_ideal (int): Number of ideal functions.
+        n_test (int): Number of test points.
+        n_train (int): Number of training functions.
+        noise (float): Standard deviation of the noise added to training and test data.
+        off_grid (bool): Draw test X values uniformly instead of from the ideal X grid.
+        seed (int): Seed of the random number generator.
+
+    Returns:
+        tuple: df_train, df_ideal, df_test with the column names of the pipeline tables.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.round(np.linspace(-20, 20, n_rows, endpoint=False), 10)
+
+    amplitude, frequency, slope, curvature, offset = rng.normal(size=(5, n_ideal, 1))
+    ideal = (amplitude * 5 * np.sin(frequency * x) + slope * x + curvature * 0.1 * x ** 2 + offset * 10).T
+    df_ideal = pd.DataFrame(ideal, columns=[f'Y{i} (ideal func)' for i in range(1, n_ideal + 1)])
+    df_ideal.insert(0, 'X', x)
+
+    chosen = rng.choice(n_ideal, size=n_train, replace=n_train > n_ideal)
+    train = ideal[:, chosen] + rng.normal(scale=noise, size=(n_rows, n_train))
+    df_train = pd.DataFrame(train, columns=[f'Y{i} (training func)' for i in range(1, n_train + 1)])
+    df_train.insert(0, 'X', x)
+
+    if off_grid:
+        test_x = rng.uniform(x[0], x[-1], size=n_test)
+        test_clean = np.array([np.interp(test_x, x, ideal[:, func]) for func in chosen]).T
+    else:
+        positions = rng.integers(0, n_rows, size=n_test)
+        test_x = x[positions]
+        test_clean = ideal[positions[:, None], chosen]
+    test_y = test_clean[np.arange(n_test), rng.integers(0, n_train, size=n_test)] + rng.normal(scale=noise, size=n_test)
+    outliers = rng.random(n_test) < 0.2
+    test_y[outliers] += rng.choice([-1, 1], size=outliers.sum()) * 1000
+    df_test = pd.DataFrame({'X (test func)': test_x, 'Y (test func)': test_y})
+
+    return df_train, df_ideal, df_test
+
+
+def measure(func, trace_memory=False):
+    """
+    Runs `func` and returns its result, the wall time in seconds and the peak memory allocated in bytes.
+
+    tracemalloc slows allocation heavy code down several times, so the peak memory is only traced when
+    `trace_memory` is set and is None otherwise. Timings of a traced run are not representative.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        seconds = time.perf_counter() - start_time
+        peak_bytes = None
+        if trace_memory:
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    return result, seconds, peak_bytes
+
+
+def run_stages(df_train, df_ideal, df_test, work_dir, stages=STAGES, off_grid=False, trace_memory=False):
+    """
+    Runs the selected pipeline stages on the given data and returns one timing record per stage.
+    The SQL stage loads the data as CSV files into a SQLite database in `work_dir`.
+    With `trace_memory` the peak memory of every stage is traced, which makes the timings unusable.
+    """
+    records = []
+
+    def record(stage, rows, func):
+        result, seconds, peak_bytes = measure(func, trace_memory)
+        records.append({
+            'stage': stage,
+            'rows': rows,
+            'seconds': seconds,
+            'peak_memory_bytes': peak_bytes,
+            'rows_per_second': rows / seconds if seconds > 0 else None
+        })
+        return result
+
+    if 'read_csv_to_sql' in stages:
+        from connection_ms_sql import table_definitions
+        from db_session import DatabaseSession
+        from read_csv_save_data_ms_sql import ReadCsv
+
+        file_to_table_map = {'train.csv': 'train_table', 'test.csv': 'test_table', 'ideal.csv': 'ideal_table'}
+        for file_name, df in zip(file_to_table_map, (df_train, df_test, df_ideal)):
+            df.to_csv(os.path.join(work_dir, file_name), index=False)
+        session = DatabaseSession(url=f"sqlite:///{os.path.join(work_dir, 'benchmark.db')}")
+        loader = ReadCsv(None, None, None, None, None, None, work_dir, list(file_to_table_map),
+                         table_definitions(df_train.shape[1] - 1, df_ideal.shape[1] - 1), file_to_table_map,
+                         session=session)
+        record('read_csv_to_sql', len(df_train) + len(df_ideal) + len(df_test), lambda: loader.read_csv_to_sql(bulk=True))
+        session.engine().dispose()
+
+    calculations = Calculations(df_train, df_ideal, df_test)
+    if 'calculate_criteria1' in stages or 'deviations' in stages or 'results' in stages or 'dashboard' in stages:
+        record('calculate_criteria1', len(df_train), calculations.calculate_criteria1)
+        record('deviations', len(df_train), calculations.deviations)
+        record('results', len(df_test),
+               lambda: calculations.results(match='interpolate' if off_grid else 'exact'))
+
+    if 'dashboard' in stages:
+        from ploting import Plot
+
+        df_test_results = pd.DataFrame(calculations.get_test_results())
+        plot = Plot(calculations.get_ssd_sums(), df_test_results, large_data=len(df_test_results) > 50000)
+        record('dashboard', len(df_test_results),
+               lambda: plot.dashboard(filename=os.path.join(work_dir, 'dashboard.html'), show_layout=False))
+
+    return [rec for rec in records if rec['stage'] in stages]
+
+
+def run_benchmarks(rows, ideal, test_rows, n_train=4, noise=0.5, off_grid=False, stages=STAGES, output='benchmark_results.json', seed=0,
+                   memory=False):
+    """
+    Runs the selected stages for every combination of `rows`, `ideal` and `test_rows` and writes all records
+    with the environment details to `output` as JSON.
+
+    The stages are timed without memory tracing. With `memory` every combination is run a second time on
+    fresh objects with tracemalloc enabled and only the peak memory of that run is recorded.
+
+    Returns:
+        list: The timing records.
+    """
+    results = []
+    for n_rows, n_ideal, n_test in itertools.product(rows, ideal, test_rows):
+        df_train, df_ideal, df_test = generate_synthetic(n_rows, n_ideal, n_test, n_train, noise, off_grid, seed)
+        with tempfile.TemporaryDirectory() as work_dir:
+            records = run_stages(df_train, df_ideal, df_test, work_dir, stages, off_grid)
+        if memory:
+            with tempfile.TemporaryDirectory() as work_dir:
+                traced = run_stages(df_train, df_ideal, df_test, work_dir, stages, off_grid, trace_memory=True)
+            for rec, traced_rec in zip(records, traced):
+                rec['peak_memory_bytes'] = traced_rec['peak_memory_bytes']
+        for rec in records:
+            rec.update(n_rows=n_rows, n_ideal=n_ideal, n_test=n_test, n_train=n_train, off_grid=off_grid)
+            results.append(rec)
+            memory_text = '' if rec['peak_memory_bytes'] is None else f" {rec['peak_memory_bytes'] / 1024 ** 2:10.1f} MiB"
+            print(f"{rec['stage']:<20} rows={n_rows:<9} ideal={n_ideal:<7} test={n_test:<9} "
+                  f"{rec['seconds']:10.4f} s{memory_text}")
+
+    with open(output, 'w') as output_file:
+        json.dump({
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'results': results
+        }, output_file, indent=2)
+    print(f'Benchmark results written to {output}')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic data.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[400, 4000], help='Rows of training and ideal data')
+    parser.add_argument('--ideal', type=int, nargs='+', default=[50, 500], help='Number of ideal functions')
+    parser.add_argument('--test-rows', type=int, nargs='+', default=[100, 10000], help='Number of test points')
+    parser.add_argument('--train', type=int, default=4, help='Number of training functions')
+    parser.add_argument('--noise', type=float, default=0.5, help='Standard deviation of the noise')
+    parser.add_argument('--off-grid', action='store_true', help='Draw test X values off the ideal X grid')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='Stages to run')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file to write the results to')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the data generator')
+    parser.add_argument('--memory', action='store_true', help='Measure peak memory in a second, traced run')
+    args = parser.parse_args()
+    run_benchmarks(args.rows, args.ideal, args.test_rows, args.train, args.noise, args.off_grid,
+                   args.stages, args.output, args.seed, args.memory)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,62 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 
+from instrumentation import Instrumentation, instrumented
+
+
+# Largest number of residuals (rows x training functions x ideal functions) held in memory at once, 32 MiB of float64
+RESIDUAL_BLOCK_ELEMENTS = 2 ** 22
+
+
+def residual_scores(train, ideal, block_size, max_elements=RESIDUAL_BLOCK_ELEMENTS):
+    """
+    Sweeps once over the residuals between every training and ideal function, block-wise over the ideal columns
+    and, for long data, the rows, and returns the SSD matrix and the maximum absolute deviation matrix, both of
+    shape (training functions, ideal functions).
+    Residuals are formed explicitly per block instead of using the ||a||^2 + ||b||^2 - 2a.b expansion,
+    which loses precision when the ideal functions take large values.
+
+    Parameters:
+        train (np.ndarray): Training values of shape (rows, training functions).
+        ideal (np.ndarray): Ideal values of shape (rows, ideal functions), row-aligned with `train`.
+        block_size (int): Maximum number of ideal functions whose residuals are held in memory at once.
+        max_elements (int): Maximum number of residuals held in memory at once. Blocks get fewer ideal functions
+                            and, if a single function over all rows does not fit, fewer rows.
+    """
+    n_rows, n_train = train.shape
+    n_ideal = ideal.shape[1]
+    block_columns = max(1, min(block_size, max_elements // max(n_rows * n_train, 1)))
+    block_rows = max(1, min(n_rows, max_elements // max(n_train * block_columns, 1)))
+
+    ssd_matrix = np.zeros((n_train, n_ideal))
+    max_deviation_matrix = np.zeros((n_train, n_ideal))
+    for start in range(0, n_ideal, block_columns):
+        stop = min(start + block_columns, n_ideal)
+        for row_start in range(0, n_rows, block_rows):
+            row_stop = row_start + block_rows
+            # residuals has shape (rows in block, training functions, ideal functions in block)
+            residuals = train[row_start:row_stop, :, np.newaxis] - ideal[row_start:row_stop, np.newaxis, start:stop]
+            # Reuse the one residual buffer for the absolute values and their squares
+            np.abs(residuals, out=residuals)
+            np.maximum(max_deviation_matrix[:, start:stop], residuals.max(axis=0), out=max_deviation_matrix[:, start:stop])
+            np.square(residuals, out=residuals)
+            ssd_matrix[:, start:stop] += residuals.sum(axis=0)
+    return ssd_matrix, max_deviation_matrix
+
+
+def _score_ideal_shard(train, ideal_path, start, stop, block_size):
+    """
+    Worker for the parallel mode of `Calculations.calculate_criteria1`. Scores the ideal columns [start, stop)
+    of the memory-mapped ideal matrix stored at `ideal_path`.
+    """
+    ideal = np.load(ideal_path, mmap_mode='r')
+    return residual_scores(train, ideal[:, start:stop], block_size)
+
+
 class Calculations:
     """
     A class to perform calculations comparing training functions to ideal functions, including SSD calculation, 
@@ -10,40 +66,271 @@ class Calculations:
         df_train (pd.DataFrame): DataFrame containing training function data sorted by 'X'.
         df_ideal (pd.DataFrame): DataFrame containing ideal function data sorted by 'X'.
         df_test (pd.DataFrame): DataFrame containing test function data.
+        instrumentation (Instrumentation): Records the time, rows and memory of each calculation stage. Disabled unless one is passed in.
     
     Methods:
-        calculate_criteria1(): Calculates the SSD for each training function against all ideal functions and identifies the top ideal function for each training function.
+        calculate_criteria1(mode='vectorized', block_size=256, workers=None): Calculates the SSD for each training function against all ideal functions and identifies the top ideal function for each training function.
+        
+        get_top_k_ideal_functions(k=3): Returns the k ideal functions with the lowest SSD and their SSD for each training function.
+        
+        score_ideal_chunks(ideal_chunks, block_size=256): Calculates the same results as `calculate_criteria1` from chunks of ideal rows without holding the full ideal data in memory.
+        
+        retain_chosen_ideal(ideal_chunks): Keeps only X and the top ideal functions of streamed ideal data for matching.
+        
+        get_ssd_matrix(): Returns the full training x ideal SSD matrix as a DataFrame.
+        
+        append_training(df_new_train): Updates the SSD and deviation results with new training rows only and reports changed top ideal functions.
+        
+        restore_scores(ssd_matrix, max_deviation_matrix, adjusted_deviations=None): Restores previously computed results, e.g. from a cache.
         
         get_ssd_sums(): Returns the dictionary containing SSD sums for each training function comparison with ideal functions.
         
         get_top_four_ideal_functions(): Returns the list of top four ideal functions with the lowest SSD for each training function.
         
-        deviations(): Calculates maximum deviations for each ideal function against training functions and adjusts them by a factor of sqrt(2).
+        get_max_deviation_matrix(): Returns the maximum absolute deviation between every training and ideal function as a DataFrame.
+        
+        deviations(mode='vectorized'): Calculates maximum deviations for each ideal function against training functions and adjusts them by a factor of sqrt(2).
         
         get_adjusted_deviation(): Returns the dictionary containing adjusted maximum deviations for each ideal function.
         
-        results(): Determines the best match for each test function based on the deviations and the selected top ideal functions. Stores the results in `test_results`.
+        results(mode='vectorized', match='exact', tolerance=None): Determines the best match for each test function based on the deviations and the selected top ideal functions. Stores the results in `test_results`.
+        
+        match_points(x, y, match='exact', tolerance=None): Returns the deviation and the matched ideal function for arrays of test points,
+                                                           optionally for X values off the ideal grid.
+        
+        classify(df_test, match='exact', tolerance=None): Returns a DataFrame with the best match for every row of a test DataFrame.
+        
+        classify_stream(test_chunks, match='exact', tolerance=None): Yields classified result chunks for an iterator of test data chunks.
+        
+        write_results_stream(result_chunks, path=None, engine=None, table_name='test_results'): Writes result chunks incrementally to a CSV file or SQL table.
         
         get_test_results(): Returns the list of dictionaries containing test results with best matches.
     """
-    def __init__(self, df_train, df_ideal, df_test):
+    def __init__(self, df_train, df_ideal, df_test, instrumentation=None):
         
         """
         Initializes the Calculations class with training, ideal, and test data.
+        `df_ideal` may be None when the ideal data is streamed with `score_ideal_chunks` instead.
         """
-        self.df_train = df_train.sort_values(by='X')
-        self.df_ideal = df_ideal.sort_values(by='X')
+        # Already sorted data, e.g. memory-mapped from a ColumnarStore, is used as is instead of being copied
+        self.df_train = df_train if df_train['X'].is_monotonic_increasing else df_train.sort_values(by='X')
+        if df_ideal is not None and not df_ideal['X'].is_monotonic_increasing:
+            df_ideal = df_ideal.sort_values(by='X')
+        self.df_ideal = df_ideal
         self.df_test = df_test
+        self.instrumentation = instrumentation or Instrumentation(enabled=False)
         self.ssd_sums = {}
         self.top_four_ideal_functions = []
         self.adjusted_deviations = {}
         self.test_results = []
+        # Column names are discovered from the frames instead of assuming 4 training and 50 ideal functions
+        self.training_functions = [col for col in self.df_train.columns if col != 'X']
+        self.ideal_functions = [] if df_ideal is None else [col for col in self.df_ideal.columns if col != 'X']
+        self.ssd_matrix = None
+        self.max_deviation_matrix = None
+        self._ideal_x = None  # Sorted X index of df_ideal, built on first lookup
+        self._ideal_columns_cache = None  # Values of the chosen ideal functions, kept for repeated matching
 
-    def calculate_criteria1(self):
+    @property
+    def df_train(self):
+        """
+        The training data sorted by 'X'. Batches added with `append_training` are merged in on first access,
+        so appending does not copy and re-sort the whole training history.
+        """
+        if self._pending_train:
+            self._df_train = pd.concat([self._df_train] + self._pending_train, ignore_index=True).sort_values(by='X')
+            self._pending_train = []
+        return self._df_train
+
+    @df_train.setter
+    def df_train(self, df_train):
+        self._df_train = df_train
+        self._pending_train = []  # Appended training batches not yet merged into _df_train
+        self._train_rows = len(df_train)
+
+    @instrumented('calculate_criteria1', rows=lambda self, *args, **kwargs: self._train_rows)
+    def calculate_criteria1(self, mode='vectorized', block_size=256, workers=None):
         """
         Calculates the sum of squared differences (SSD) between each training function and all ideal functions.
         Identifies the top ideal function with the lowest SSD for each training function.
+
+        Parameters:
+            mode (str): 'vectorized' computes the whole training x ideal SSD matrix, together with the maximum absolute
+                        deviation matrix used by `deviations`, in one batched NumPy pass,
+                        'parallel' does the same with the ideal functions split into shards scored in a process pool,
+                        'loop' keeps the original column-by-column calculation as a reference.
+            block_size (int): Maximum number of ideal functions whose residuals are held in memory at once, see `residual_scores`.
+            workers (int, optional): Number of worker processes in parallel mode, defaults to the number of CPUs.
+        """
+        if mode == 'loop':
+            self._calculate_criteria1_loop()
+        elif mode == 'vectorized':
+            ssd_matrix, self.max_deviation_matrix = self._residual_kernel(block_size)
+            self._set_ssd_matrix(ssd_matrix)
+        elif mode == 'parallel':
+            ssd_matrix, self.max_deviation_matrix = self._residual_kernel_parallel(block_size, workers)
+            self._set_ssd_matrix(ssd_matrix)
+        else:
+            raise ValueError(f"Unknown mode '{mode}', expected 'vectorized', 'parallel' or 'loop'")
+        print("Top ideal function for each training function:", self.top_four_ideal_functions)
+
+    @instrumented('score_ideal_chunks', rows=lambda self, *args, **kwargs: self._train_rows)
+    def score_ideal_chunks(self, ideal_chunks, block_size=256):
+        """
+        Out-of-core version of `calculate_criteria1`: accumulates the SSD and maximum deviation matrices from
+        chunks of ideal rows, so the full ideal data is never held in memory. Each chunk is matched to all
+        training rows with the same X, its partial sums are added and the chunk is released. If the ideal data
+        repeats an X value, the first row streamed with it is used.
+
+        Parameters:
+            ideal_chunks (iterable of DataFrame): Chunks of ideal rows with the columns of the ideal table, in any
+                                                  X order, e.g. from `pd.read_sql_query("SELECT * FROM ideal_table",
+                                                  engine, chunksize=...)` or `pd.read_csv(..., chunksize=...)`.
+            block_size (int): Maximum number of ideal functions whose residuals are held in memory at once, see `residual_scores`.
+        """
+        train_x = self.df_train['X'].to_numpy(dtype=np.float64)
+        train = self.df_train[self.training_functions].to_numpy(dtype=np.float64)
+        covered = np.zeros(len(train_x), dtype=bool)
+        ssd_matrix = max_deviation_matrix = None
+
+        for df_chunk in ideal_chunks:
+            if ssd_matrix is None:
+                self.ideal_functions = [col for col in df_chunk.columns if col != 'X']
+                ssd_matrix = np.zeros((len(self.training_functions), len(self.ideal_functions)))
+                max_deviation_matrix = np.zeros_like(ssd_matrix)
+
+            # Every training row in [left, right) has the X of the ideal row, repeated training X included
+            chunk_x = df_chunk['X'].to_numpy(dtype=np.float64)
+            left = np.searchsorted(train_x, chunk_x, side='left')
+            counts = np.searchsorted(train_x, chunk_x, side='right') - left
+            if not counts.any():
+                continue
+
+            ideal_rows = np.repeat(np.arange(len(chunk_x)), counts)
+            rows = np.repeat(left, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            # A training row is scored against the first ideal row seen with its X, like the in-memory lookup
+            rows, first = np.unique(rows, return_index=True)
+            ideal_rows = ideal_rows[first]
+            unscored = ~covered[rows]
+            rows, ideal_rows = rows[unscored], ideal_rows[unscored]
+            if not len(rows):
+                continue
+
+            chunk_ideal = df_chunk[self.ideal_functions].to_numpy(dtype=np.float64)[ideal_rows]
+            chunk_ssd, chunk_max_deviation = residual_scores(train[rows], chunk_ideal, block_size)
+            ssd_matrix += chunk_ssd
+            np.maximum(max_deviation_matrix, chunk_max_deviation, out=max_deviation_matrix)
+            covered[rows] = True
+
+        if ssd_matrix is None or not covered.all():
+            raise ValueError(f"{(~covered).sum()} training rows have no ideal row with the same X")
+        self.max_deviation_matrix = max_deviation_matrix
+        self._set_ssd_matrix(ssd_matrix)
+        print("Top ideal function for each training function:", self.top_four_ideal_functions)
+
+    def retain_chosen_ideal(self, ideal_chunks):
+        """
+        Keeps only the X column and the top ideal functions of streamed ideal data as `df_ideal`, which is all
+        `results` and `classify` need after `score_ideal_chunks`.
+
+        Parameters:
+            ideal_chunks (iterable of DataFrame): Chunks of ideal rows containing at least 'X' and the top ideal
+                                                  functions, e.g. from a query selecting only those columns.
+        """
+        columns = ['X'] + list(dict.fromkeys(self.top_four_ideal_functions))
+        self.df_ideal = pd.concat([df_chunk[columns] for df_chunk in ideal_chunks], ignore_index=True).sort_values(by='X')
+        self._ideal_x = None
+        self._ideal_columns_cache = None
+
+    def _aligned_arrays(self):
+        """
+        Returns the training and ideal values as row-aligned float64 arrays. When the training data does not cover
+        exactly the X values of the ideal data, the ideal rows are looked up at the training X values.
+        """
+        train = self._function_values(self.df_train, self.training_functions)
+        train_x = self.df_train['X'].to_numpy(dtype=np.float64)
+        if np.array_equal(train_x, self.df_ideal['X'].to_numpy(dtype=np.float64)):
+            ideal = self._function_values(self.df_ideal, self.ideal_functions)
+        else:
+            ideal = self._ideal_values(train_x, self.ideal_functions)
+        return train, ideal
+
+    @staticmethod
+    def _function_values(df, functions):
+        """
+        Returns the columns `functions` of `df` as a float64 array. When they are all columns after X, e.g. for
+        frames loaded from a `ColumnarStore`, the array is a view on the frame's data instead of a copy.
+        """
+        if list(df.columns) == ['X'] + list(functions):
+            matrix = df.to_numpy(dtype=np.float64, copy=False)
+            if np.shares_memory(matrix, df['X'].to_numpy()):
+                return matrix[:, 1:]
+        return df[functions].to_numpy(dtype=np.float64)
+
+    def _residual_kernel(self, block_size):
+        """
+        Returns the SSD matrix and the maximum absolute deviation matrix for all training and ideal functions.
+        """
+        return residual_scores(*self._aligned_arrays(), block_size)
+
+    def _residual_kernel_parallel(self, block_size, workers):
+        """
+        Splits the ideal functions into one shard per worker and scores the shards in a process pool.
+        The ideal matrix is written once to a memory-mapped file that every worker opens, so it is not
+        pickled to each process. Each column is reduced in the same order as in the serial kernel,
+        so the merged matrices are identical to the serial result.
+        """
+        train, ideal = self._aligned_arrays()
+        workers = workers or os.cpu_count() or 1
+        bounds = np.linspace(0, ideal.shape[1], min(workers, ideal.shape[1]) + 1).astype(int)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ideal_path = os.path.join(tmp_dir, 'ideal.npy')
+            np.save(ideal_path, ideal)
+            del ideal
+            with ProcessPoolExecutor(max_workers=len(bounds) - 1) as executor:
+                futures = [
+                    executor.submit(_score_ideal_shard, train, ideal_path, start, stop, block_size)
+                    for start, stop in zip(bounds[:-1], bounds[1:])
+                ]
+                shards = [future.result() for future in futures]
+
+        ssd_matrix = np.hstack([shard_ssd for shard_ssd, _ in shards])
+        max_deviation_matrix = np.hstack([shard_max for _, shard_max in shards])
+        return ssd_matrix, max_deviation_matrix
+
+    def restore_scores(self, ssd_matrix, max_deviation_matrix, adjusted_deviations=None):
+        """
+        Restores previously computed results, e.g. from a cache, instead of running `calculate_criteria1`
+        and `deviations`.
+
+        Parameters:
+            ssd_matrix (np.ndarray): SSD matrix of shape (training functions, ideal functions).
+            max_deviation_matrix (np.ndarray): Maximum absolute deviation matrix of the same shape.
+            adjusted_deviations (dict, optional): Adjusted deviations of the top ideal functions.
+        """
+        self.max_deviation_matrix = np.asarray(max_deviation_matrix, dtype=np.float64)
+        self._set_ssd_matrix(np.asarray(ssd_matrix, dtype=np.float64))
+        self.adjusted_deviations = dict(adjusted_deviations or {})
+
+    def _set_ssd_matrix(self, ssd_matrix):
+        """
+        Stores the SSD matrix and derives `ssd_sums` and the top ideal function for each training function from it.
         """
+        self.ssd_matrix = ssd_matrix
+        self.ssd_sums = {
+            train_func: dict(zip(self.ideal_functions, ssd_matrix[j]))
+            for j, train_func in enumerate(self.training_functions)
+        }
+        # argmin returns the first minimum, the same function the stable sort picks in loop mode
+        self.top_four_ideal_functions = [self.ideal_functions[i] for i in np.argmin(ssd_matrix, axis=1)]
+
+    def _calculate_criteria1_loop(self):
+        """
+        Reference implementation of criteria 1 computing one SSD per training and ideal function pair.
+        """
+        self.ssd_sums = {}
+        self.top_four_ideal_functions = []
         for j in range(1, 5):  # Assuming df_train has columns like 'Y1', 'Y2', 'Y3', 'Y4' for training functions
             ssd_sums1 = {}
             for i in range(1, 51):  # Assuming 50 ideal functions
@@ -53,7 +340,47 @@ class Calculations:
             self.ssd_sums[f'Y{j} (training func)'] = ssd_sums1
             # Sort and find the ideal function with the lowest SSD
             self.top_four_ideal_functions.append(sorted(ssd_sums1, key=ssd_sums1.get)[0])
-        print("Top ideal function for each training function:", self.top_four_ideal_functions)
+        self.ssd_matrix = np.array([list(ssd_sums1.values()) for ssd_sums1 in self.ssd_sums.values()])
+
+    @instrumented('append_training', rows=lambda self, df_new_train, *args, **kwargs: len(df_new_train))
+    def append_training(self, df_new_train, block_size=256):
+        """
+        Updates the SSD matrix, the maximum deviation matrix, the top ideal functions and, if they were calculated,
+        the adjusted deviations with new training rows. Only the new rows are swept and they are merged into
+        `df_train` lazily, so the cost is proportional to the size of the batch and not to the whole training history.
+
+        Parameters:
+            df_new_train (pd.DataFrame): New training rows with the same columns as `df_train`.
+                                         Their X values must be present in the ideal data.
+            block_size (int): Maximum number of ideal functions whose residuals are held in memory at once, see `residual_scores`.
+
+        Returns:
+            dict: Maps every training function whose top ideal function changed to a (previous, new) tuple.
+        """
+        if self.ssd_matrix is None or self.max_deviation_matrix is None:
+            raise ValueError("Call calculate_criteria1 before appending training data")
+
+        new_train = df_new_train[self.training_functions].to_numpy(dtype=np.float64)
+        new_ideal = self._ideal_values(df_new_train['X'].to_numpy(dtype=np.float64), self.ideal_functions)
+        new_ssd, new_max_deviation = residual_scores(new_train, new_ideal, block_size)
+
+        previous_top = self.top_four_ideal_functions
+        # Kept aside and only merged into df_train when the full training data is read again
+        self._pending_train.append(df_new_train[self._df_train.columns])
+        self._train_rows += len(df_new_train)
+        self.max_deviation_matrix = np.maximum(self.max_deviation_matrix, new_max_deviation)
+        self._set_ssd_matrix(self.ssd_matrix + new_ssd)
+        if self.adjusted_deviations:
+            self.deviations()
+
+        changes = {
+            train_func: (previous, current)
+            for train_func, previous, current in zip(self.training_functions, previous_top, self.top_four_ideal_functions)
+            if previous != current
+        }
+        if changes:
+            print("Top ideal function changed for training functions:", changes)
+        return changes
 
     def get_ssd_sums(self):
         """
@@ -61,16 +388,74 @@ class Calculations:
         """
         return self.ssd_sums
 
+    def get_top_k_ideal_functions(self, k=3):
+        """
+        Returns the k ideal functions with the lowest SSD for each training function, using partial selection
+        over the SSD matrix instead of sorting all candidates.
+
+        Parameters:
+            k (int): Number of ideal functions to return per training function.
+
+        Returns:
+            dict: Maps each training function to a list of (ideal function, SSD) tuples in ascending SSD order.
+                  Ties are broken by the position of the ideal function, like `get_top_four_ideal_functions`.
+        """
+        k = min(k, len(self.ideal_functions))
+        top_k = {}
+        for train_func, ssd_row in zip(self.training_functions, self.ssd_matrix):
+            kth_ssd = ssd_row[np.argpartition(ssd_row, k - 1)[k - 1]]
+            # Candidates are everything up to the k-th smallest SSD, in column order so ties keep the first function
+            candidates = np.flatnonzero(ssd_row <= kth_ssd)
+            best = candidates[np.argsort(ssd_row[candidates], kind='stable')[:k]]
+            top_k[train_func] = [(self.ideal_functions[i], ssd_row[i]) for i in best]
+        return top_k
+
+    def get_ssd_matrix(self):
+        """
+        Returns the SSD matrix as a DataFrame indexed by training function with one column per ideal function.
+        """
+        return pd.DataFrame(self.ssd_matrix, index=self.training_functions, columns=self.ideal_functions)
+
     def get_top_four_ideal_functions(self):
         """
         Returns the list of top four ideal functions based on SSD sums.
         """
         return self.top_four_ideal_functions
     
-    def deviations(self):
+    def get_max_deviation_matrix(self):
+        """
+        Returns the maximum absolute deviation between every training and ideal function as a DataFrame
+        indexed by training function with one column per ideal function.
+        """
+        if self.max_deviation_matrix is None:
+            _, self.max_deviation_matrix = self._residual_kernel(block_size=256)
+        return pd.DataFrame(self.max_deviation_matrix, index=self.training_functions, columns=self.ideal_functions)
+
+    @instrumented('deviations', rows=lambda self, *args, **kwargs: self._train_rows)
+    def deviations(self, mode='vectorized'):
         """
         Calculates maximum deviations for each ideal function across all training functions and adjusts them
         by a factor of sqrt(2).
+
+        Parameters:
+            mode (str): 'vectorized' looks the deviations up in the maximum deviation matrix computed together with
+                        the SSD matrix, 'loop' keeps the original calculation as a reference.
+        """
+        if mode == 'loop':
+            self._deviations_loop()
+        elif mode == 'vectorized':
+            max_deviations = self.get_max_deviation_matrix().max(axis=0)
+            # Adjust max deviations by factor sqrt(2)
+            adjustment_factor = np.sqrt(2)
+            self.adjusted_deviations = {
+                func: max_deviations[func] * adjustment_factor for func in self.top_four_ideal_functions
+            }
+        else:
+            raise ValueError(f"Unknown mode '{mode}', expected 'vectorized' or 'loop'")
+
+    def _deviations_loop(self):
+        """
+        Reference implementation recomputing the deviations of the chosen ideal functions from the data.
         """
         top_four_ideal_functions = self.top_four_ideal_functions
         # Assuming the training function columns are named 'Y1 (training func)', 'Y2 (training func)', etc.
@@ -98,9 +483,158 @@ class Calculations:
         """
         return self.adjusted_deviations
     
-    def results(self):
+    @instrumented('results', rows=lambda self, *args, **kwargs: len(self.df_test))
+    def results(self, mode='vectorized', match='exact', tolerance=None):
         """
         Finds the best match for each test function based on deviations and stores the results.
+
+        Parameters:
+            mode (str): 'vectorized' matches all test points at once through the X index of the ideal data,
+                        'loop' keeps the original row-by-row matching as a reference.
+            match (str): In vectorized mode, how test X values are looked up in the ideal data. 'exact' requires
+                         them to be on the ideal grid, 'nearest' and 'interpolate' also handle off-grid X values.
+            tolerance (float, optional): Largest allowed distance to the closest ideal X for 'nearest' and 'interpolate'.
+        """
+        if mode == 'loop':
+            self._results_loop()
+        elif mode == 'vectorized':
+            df_results = self.classify(self.df_test, match, tolerance)
+            self.test_results.extend(
+                {
+                    'X (test func)': x_val,
+                    'Y (test func)': y_val,
+                    'Delta Y (test func)': deviation if func else None,
+                    'No. of ideal func': func
+                }
+                for x_val, y_val, deviation, func in zip(*(df_results[col].tolist() for col in df_results.columns))
+            )
+        else:
+            raise ValueError(f"Unknown mode '{mode}', expected 'vectorized' or 'loop'")
+
+    def _ideal_columns(self, functions, cache=False):
+        """
+        Returns the values of the given ideal functions as a float64 array. With `cache`, the array is kept so
+        repeated lookups of the same functions, e.g. the chosen functions while matching batches, do not copy
+        them out of `df_ideal` again.
+        """
+        key = tuple(functions)
+        if self._ideal_columns_cache is not None and self._ideal_columns_cache[0] == key:
+            return self._ideal_columns_cache[1]
+        values = self.df_ideal[list(functions)].to_numpy(dtype=np.float64)
+        if cache:
+            self._ideal_columns_cache = (key, values)
+        return values
+
+    def _ideal_values(self, x, functions, match='exact', tolerance=None, cache=False):
+        """
+        Looks up the values of the given ideal functions at every value in `x` using binary search over the
+        sorted X column of `df_ideal`.
+
+        Parameters:
+            x (np.ndarray): X values to look up.
+            functions (list of str): Names of the ideal functions to return.
+            match (str): 'exact' requires every finite X to be on the ideal grid and raises a ValueError otherwise,
+                         'nearest' takes the value at the closest grid X,
+                         'interpolate' interpolates linearly between the two neighbouring grid X values.
+            tolerance (float, optional): For 'nearest' and 'interpolate', the largest allowed distance to the closest
+                                         grid X. Points further away get NaN and therefore no match.
+                                         X values outside the range of the ideal X values get NaN in both modes,
+                                         non-finite X values get NaN in every mode.
+            cache (bool): Keep the values of `functions` for later lookups, see `_ideal_columns`.
+
+        Returns:
+            np.ndarray: Array of shape (len(x), len(functions)).
+        """
+        if self._ideal_x is None:
+            self._ideal_x = self.df_ideal['X'].to_numpy(dtype=np.float64)
+        grid = self._ideal_x
+        ideal_y = self._ideal_columns(functions, cache)
+        positions = np.searchsorted(grid, x)
+        # NaN or infinite X values can not be looked up in any mode and never match
+        not_finite = ~np.isfinite(x)
+
+        if match == 'exact':
+            positions = np.minimum(positions, len(grid) - 1)
+            missing = (grid[positions] != x) & ~not_finite
+            if missing.any():
+                raise ValueError(f"X value {x[missing][0]} of the test data is not present in the ideal data")
+            values = ideal_y[positions]
+            values[not_finite] = np.nan
+            return values
+
+        if match not in ('nearest', 'interpolate'):
+            raise ValueError(f"Unknown match '{match}', expected 'exact', 'nearest' or 'interpolate'")
+
+        # Closest grid point, preferring the lower X when both neighbours are equally far away
+        right = np.minimum(positions, len(grid) - 1)
+        left = np.maximum(positions - 1, 0)
+        nearest = np.where(np.abs(x - grid[left]) <= np.abs(grid[right] - x), left, right)
+        # Written as "not within" so that a NaN distance counts as too far
+        too_far = not_finite.copy() if tolerance is None else ~(np.abs(x - grid[nearest]) <= tolerance) | not_finite
+        # Neither mode extrapolates: X values outside the ideal X range never match
+        too_far |= (x < grid[0]) | (x > grid[-1])
+
+        if match == 'nearest' or len(grid) == 1:
+            values = ideal_y[nearest]
+        else:
+            lower = np.clip(positions - 1, 0, len(grid) - 2)
+            with np.errstate(invalid='ignore'):
+                weight = ((x - grid[lower]) / (grid[lower + 1] - grid[lower]))[:, np.newaxis]
+                values = ideal_y[lower] * (1 - weight) + ideal_y[lower + 1] * weight
+
+        values[too_far] = np.nan
+        return values
+
+    def match_points(self, x, y, match='exact', tolerance=None):
+        """
+        Matches test points against the chosen ideal functions in one vectorized pass.
+
+        Parameters:
+            x (array-like): X values of the test points.
+            y (array-like): Y values of the test points.
+            match (str): How test X values are looked up in the ideal data, 'exact', 'nearest' or 'interpolate'.
+            tolerance (float, optional): Largest allowed distance to the closest ideal X for 'nearest' and 'interpolate'.
+
+        Returns:
+            tuple: An array with the deviation to the matched ideal function (NaN if no function matched)
+                   and an object array with the name of the matched ideal function (None if no function matched).
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        chosen_functions = self.top_four_ideal_functions
+
+        # ideal_y has shape (test points, chosen functions)
+        ideal_y = self._ideal_values(x, chosen_functions, match, tolerance, cache=True)
+        deviations = np.abs(ideal_y - y[:, np.newaxis])
+        thresholds = np.array([self.adjusted_deviations[func] for func in chosen_functions])
+        # NaN deviations (no ideal value available) fail the comparison and are never matched
+        deviations = np.where(deviations < thresholds, deviations, np.inf)
+
+        # argmin keeps the first function on ties, like the strict comparison of the loop
+        best = np.argmin(deviations, axis=1)
+        best_deviation = deviations[np.arange(len(x)), best]
+        matched = np.isfinite(best_deviation)
+
+        functions = np.array(chosen_functions, dtype=object)[best]
+        functions[~matched] = None
+        return np.where(matched, best_deviation, np.nan), functions
+
+    def classify(self, df_test, match='exact', tolerance=None):
+        """
+        Returns a DataFrame with the best match for every row of `df_test`, using the same columns as `test_results`.
+        See `match_points` for `match` and `tolerance`.
+        """
+        deviation, functions = self.match_points(df_test['X (test func)'], df_test['Y (test func)'], match, tolerance)
+        return pd.DataFrame({
+            'X (test func)': df_test['X (test func)'].to_numpy(),
+            'Y (test func)': df_test['Y (test func)'].to_numpy(),
+            'Delta Y (test func)': deviation,
+            'No. of ideal func': functions
+        })
+
+    def _results_loop(self):
+        """
+        Reference implementation matching the test data row by row.
         """
         def find_best_match(x_val, y_val, chosen_functions, df_ideal, adjusted_deviations):
             best_match = {'func': None, 'deviation': np.inf}
@@ -124,6 +658,47 @@ class Calculations:
                 
             })
             
+    def classify_stream(self, test_chunks, match='exact', tolerance=None):
+        """
+        Classifies test data chunk by chunk so memory stays bounded by the chunk size.
+
+        Parameters:
+            test_chunks (iterable of DataFrame): Test data chunks, e.g. from `pd.read_csv(..., chunksize=...)`
+                                                 or `pd.read_sql_query(..., chunksize=...)`.
+            match (str): How test X values are looked up in the ideal data, see `match_points`.
+            tolerance (float, optional): Largest allowed distance to the closest ideal X, see `match_points`.
+
+        Yields:
+            DataFrame: The classified chunk with the same columns as `test_results`.
+        """
+        for df_chunk in test_chunks:
+            yield self.classify(df_chunk, match, tolerance)
+
+    @staticmethod
+    def write_results_stream(result_chunks, path=None, engine=None, table_name='test_results'):
+        """
+        Writes classified result chunks incrementally to a CSV file and/or a SQL table as they arrive.
+        The first chunk replaces an existing file or table, all following chunks are appended.
+
+        Parameters:
+            result_chunks (iterable of DataFrame): Chunks as yielded by `classify_stream`.
+            path (str, optional): Path of the CSV file to write.
+            engine (SQLAlchemy engine, optional): Engine of the database to write `table_name` to.
+            table_name (str): Name of the SQL table.
+
+        Returns:
+            int: Number of rows written.
+        """
+        rows_written = 0
+        for chunk_number, df_chunk in enumerate(result_chunks):
+            first_chunk = chunk_number == 0
+            if path is not None:
+                df_chunk.to_csv(path, mode='w' if first_chunk else 'a', header=first_chunk, index=False)
+            if engine is not None:
+                df_chunk.to_sql(name=table_name, con=engine, if_exists='replace' if first_chunk else 'append', index=False)
+            rows_written += len(df_chunk)
+        return rows_written
+
     def get_test_results(self):
         """
         Returns the list of test results containing the best matches for the test functions.
@@ -0,0 +1,134 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class CalculationCache:
+    """
+    A content-addressed on-disk cache for the results of `Calculations`.
+
+    Entries are keyed by a hash of the content of the training and ideal data, so any change to the inputs
+    leads to a new key and the outdated entry is never used again. Each entry is a compressed `.npz` file
+    holding the SSD matrix, the maximum deviation matrix, the top ideal functions and the adjusted deviations.
+    The least recently used entries are evicted when the cache grows beyond `max_bytes` or `max_entries`.
+
+    Attributes:
+        cache_dir (str): Directory in which the cache entries are stored.
+        max_bytes (int): Maximum total size of all entries in bytes.
+        max_entries (int): Maximum number of entries.
+
+    Methods:
+        dataset_key(df_train, df_ideal): Returns the content hash used as key for the given training and ideal data.
+
+        load(calculations): Restores the results of `calculations` from the cache. Returns True on a hit.
+
+        store(calculations): Saves the results of `calculations` to the cache and evicts old entries.
+
+        compute(calculations): Loads the results from the cache or runs `calculate_criteria1` and `deviations`
+                               and stores them. Returns True on a hit.
+    """
+
+    def __init__(self, cache_dir='.calculation_cache', max_bytes=512 * 1024 ** 2, max_entries=16):
+        """
+        Initializes the cache and creates the cache directory if it does not exist.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def dataset_key(df_train, df_ideal):
+        """
+        Returns a SHA-256 hex digest over the column names and values of the training and ideal data.
+        """
+        digest = hashlib.sha256()
+        for df in (df_train, df_ideal):
+            digest.update('\x1f'.join(map(str, df.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def _entry_path(self, calculations):
+        """
+        Returns the path of the cache entry for the data of `calculations`.
+        """
+        return os.path.join(self.cache_dir, f'{self.dataset_key(calculations.df_train, calculations.df_ideal)}.npz')
+
+    def load(self, calculations):
+        """
+        Restores the SSD matrix, the maximum deviation matrix, the top ideal functions and the adjusted deviations
+        of `calculations` from the cache.
+
+        Returns:
+            bool: True if a matching entry was found.
+        """
+        path = self._entry_path(calculations)
+        if not os.path.exists(path):
+            return False
+
+        with np.load(path, allow_pickle=False) as entry:
+            if (entry['training_functions'].tolist() != calculations.training_functions
+                    or entry['ideal_functions'].tolist() != calculations.ideal_functions):
+                return False
+            adjusted_deviations = dict(zip(entry['deviation_functions'].tolist(), entry['adjusted_deviations']))
+            calculations.restore_scores(entry['ssd_matrix'], entry['max_deviation_matrix'], adjusted_deviations)
+
+        # Refresh the modification time so eviction treats the entry as recently used
+        os.utime(path)
+        return True
+
+    def store(self, calculations):
+        """
+        Saves the results of `calculations` to the cache and evicts the least recently used entries
+        if the cache is over its limits.
+        """
+        path = self._entry_path(calculations)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as entry:
+            np.savez_compressed(
+                entry,
+                ssd_matrix=calculations.ssd_matrix,
+                max_deviation_matrix=calculations.max_deviation_matrix,
+                training_functions=np.array(calculations.training_functions, dtype=str),
+                ideal_functions=np.array(calculations.ideal_functions, dtype=str),
+                deviation_functions=np.array(list(calculations.adjusted_deviations), dtype=str),
+                adjusted_deviations=np.array(list(calculations.adjusted_deviations.values()), dtype=np.float64),
+            )
+        # Replace atomically so concurrent runs never read a partially written entry
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def compute(self, calculations, **criteria_kwargs):
+        """
+        Loads the results of `calculations` from the cache. On a miss, runs `calculate_criteria1` with
+        `criteria_kwargs` and `deviations`, then stores the results.
+
+        Returns:
+            bool: True if the results were loaded from the cache.
+        """
+        if self.load(calculations):
+            print(f"Loaded cached results, top ideal function for each training function: {calculations.top_four_ideal_functions}")
+            return True
+        calculations.calculate_criteria1(**criteria_kwargs)
+        calculations.deviations()
+        self.store(calculations)
+        return False
+
+    def _evict(self):
+        """
+        Removes the least recently used entries until the cache is within `max_bytes` and `max_entries`.
+        """
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.cache_dir, file_name))
+                entries.append((stat.st_mtime, stat.st_size, file_name))
+        entries.sort()
+
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (total_bytes > self.max_bytes or len(entries) > self.max_entries):
+            _, size, file_name = entries.pop(0)
+            os.remove(os.path.join(self.cache_dir, file_name))
+            total_bytes -= size
@@ -0,0 +1,248 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from calculation import Calculations
+
+
+class ClassificationService:
+    """
+    A long-lived classifier that keeps the ideal functions and their adjusted deviations resident in memory
+    and serves classification requests without re-running the pipeline.
+
+    Concurrent requests are collected into micro-batches by a background thread: the first waiting request
+    opens a batch and every request already queued behind it joins. A request that arrives at an idle service
+    is matched at once; only under load does the batch wait up to `max_wait_ms` for further requests. A batch
+    holds at most `max_batch_size` points and is matched with one vectorized `Calculations.match_points` call. Requests are served in-process
+    through `classify` and optionally over HTTP on a local port.
+
+    Attributes:
+        calculations (Calculations): Calculations with the top ideal functions and adjusted deviations computed.
+        match (str): How test X values are looked up in the ideal data, see `Calculations.match_points`.
+        tolerance (float, optional): Largest allowed distance to the closest ideal X, see `Calculations.match_points`.
+        max_batch_size (int): Maximum number of points matched in one batch.
+        max_wait_ms (float): Maximum time a batch of several queued requests waits for further requests before it is matched.
+
+    Methods:
+        from_frames(df_train, df_ideal, cache=None, **kwargs): Creates a service from training and ideal data, computing or loading the scores once.
+
+        start(): Starts the batching thread.
+
+        stop(): Stops the batching thread and the HTTP server.
+
+        classify(x, y): Classifies test points and returns their deviations and matched ideal functions.
+
+        latency_percentiles(): Returns the 50th, 95th and 99th percentile request latency in milliseconds.
+
+        start_http_server(host='127.0.0.1', port=8080): Serves POST /classify and GET /stats on a local port in a background thread.
+    """
+
+    def __init__(self, calculations, match='exact', tolerance=None, max_batch_size=4096, max_wait_ms=2.0, latency_window=10000):
+        """
+        Initializes the service. The top ideal functions and adjusted deviations of `calculations` must be computed.
+        """
+        if not calculations.top_four_ideal_functions or not calculations.adjusted_deviations:
+            raise ValueError("Calculations must have calculate_criteria1 and deviations computed")
+        self.calculations = calculations
+        self.match = match
+        self.tolerance = tolerance
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._requests = queue.Queue()
+        self._latencies = deque(maxlen=latency_window)
+        self._latencies_lock = threading.Lock()
+        self._worker = None
+        self._http_server = None
+
+    @classmethod
+    def from_frames(cls, df_train, df_ideal, cache=None, **kwargs):
+        """
+        Creates a service from training and ideal data. The scores are computed once, or loaded from a
+        `CalculationCache` if one is given.
+        """
+        calculations = Calculations(df_train, df_ideal, df_test=None)
+        if cache is not None:
+            cache.compute(calculations)
+        else:
+            calculations.calculate_criteria1()
+            calculations.deviations()
+        return cls(calculations, **kwargs)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Starts the batching thread and returns the service.
+        """
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run_batches, name='classification-batcher', daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the HTTP server, if running, and the batching thread after the queued requests are served.
+        """
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+        if self._worker is not None:
+            self._requests.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def classify(self, x, y):
+        """
+        Classifies test points. Blocks until the batch containing them has been matched.
+
+        Parameters:
+            x (array-like): X values of the test points.
+            y (array-like): Y values of the test points.
+
+        Returns:
+            tuple: The deviations (NaN if no function matched) and the matched ideal functions (None if no function matched).
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        if x.shape != y.shape:
+            raise ValueError(f"x and y must have the same length, got {len(x)} and {len(y)}")
+        if self._worker is None:
+            raise RuntimeError("The service is not running, call start() first")
+
+        future = Future()
+        self._requests.put((x, y, future, time.perf_counter()))
+        return future.result()
+
+    def _run_batches(self):
+        """
+        Collects queued requests into batches and matches each batch with one vectorized call.
+        """
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            batch = [request]
+            batch_size = len(request[0])
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            stopping = False
+            while batch_size < self.max_batch_size:
+                try:
+                    request = self._requests.get_nowait()
+                except queue.Empty:
+                    # A lone request at an idle service is matched at once instead of waiting for company
+                    remaining = deadline - time.perf_counter()
+                    if len(batch) == 1 or remaining <= 0:
+                        break
+                    try:
+                        request = self._requests.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                batch_size += len(request[0])
+
+            self._match_batch(batch)
+            if stopping:
+                return
+
+    def _match_batch(self, batch):
+        """
+        Matches the points of all requests in `batch` at once and hands each request its share of the results.
+        If the batch fails, e.g. because one request has an X value missing from the ideal data in exact mode,
+        the requests are matched one by one so only the faulty request receives the error.
+        """
+        try:
+            deviations, functions = self.calculations.match_points(
+                np.concatenate([x for x, _, _, _ in batch]),
+                np.concatenate([y for _, y, _, _ in batch]),
+                self.match, self.tolerance
+            )
+        except Exception as e:
+            if len(batch) > 1:
+                for request in batch:
+                    self._match_batch([request])
+            else:
+                batch[0][2].set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        with self._latencies_lock:
+            self._latencies.extend((finished - queued) * 1000 for _, _, _, queued in batch)
+        offset = 0
+        for x, _, future, _ in batch:
+            future.set_result((deviations[offset:offset + len(x)], functions[offset:offset + len(x)]))
+            offset += len(x)
+
+    def latency_percentiles(self):
+        """
+        Returns the 50th, 95th and 99th percentile latency in milliseconds of the most recent requests,
+        from queueing to the result, together with the number of requests they cover.
+        """
+        with self._latencies_lock:
+            latencies = np.array(self._latencies)
+        if len(latencies) == 0:
+            return {'count': 0, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        return {'count': len(latencies), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+
+    def start_http_server(self, host='127.0.0.1', port=8080):
+        """
+        Serves the classifier over HTTP in a background thread and returns the server.
+
+        POST /classify with a JSON body {"x": [...], "y": [...]} returns {"delta_y": [...], "ideal_func": [...]},
+        with null where no ideal function matched. GET /stats returns the latency percentiles.
+        """
+        self.start()
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path == '/stats':
+                    self._send_json(200, service.latency_percentiles())
+                else:
+                    self._send_json(404, {'error': f'Unknown path {self.path}'})
+
+            def do_POST(self):
+                if self.path != '/classify':
+                    self._send_json(404, {'error': f'Unknown path {self.path}'})
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                    deviations, functions = service.classify(body['x'], body['y'])
+                except (ValueError, KeyError, TypeError) as e:
+                    self._send_json(400, {'error': str(e)})
+                    return
+                self._send_json(200, {
+                    'delta_y': [None if np.isnan(deviation) else float(deviation) for deviation in deviations],
+                    'ideal_func': functions.tolist()
+                })
+
+            def log_message(self, format, *args):
+                # Keep request logging out of the console, latencies are available through /stats
+                pass
+
+        self._http_server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._http_server.serve_forever, name='classification-http', daemon=True).start()
+        print(f'Classification service listening on http://{host}:{self._http_server.server_port}')
+        return self._http_server
@@ -0,0 +1,242 @@
+"""
+Command-line entry point for the pipeline, with one subcommand per stage:
+
+    python cli.py load   --dataset-path . --url sqlite:///assignment.db
+    python cli.py score  --train train.csv --ideal ideal.csv --output scores.json
+    python cli.py match  --train train.csv --ideal ideal.csv --test test.csv --output test_results.csv
+    python cli.py render --scores scores.json --results test_results.csv --output dahboard.html
+
+Only pandas and NumPy are imported up front. The database modules (pyodbc, SQLAlchemy) are imported by
+`load` and by `match --to-sql`, Bokeh only by `render`, so compute-only runs start quickly and never touch
+a database or open a browser.
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def read_input(path, kind, store=None):
+    """
+    Reads a train, ideal or test CSV file and names its columns like the pipeline tables.
+    With a `ColumnarStore`, the file is parsed once and memory-mapped on later runs.
+    """
+    with open(path, 'r') as csvfile:
+        num_columns = len(csvfile.readline().split(','))
+    if kind == 'train':
+        columns = ['X'] + [f'Y{i} (training func)' for i in range(1, num_columns)]
+    elif kind == 'ideal':
+        columns = ['X'] + [f'Y{i} (ideal func)' for i in range(1, num_columns)]
+    else:
+        columns = ['X (test func)', 'Y (test func)']
+
+    if store is not None:
+        return store.load_csv(path, columns, name=f'{kind}_table')
+    import pandas as pd
+    return pd.read_csv(path, names=columns, header=0, usecols=range(len(columns)))
+
+
+def compute_scores(args, instrumentation):
+    """
+    Returns Calculations with the SSD matrix, top ideal functions and adjusted deviations computed,
+    loading them from the result cache when one is configured and the inputs are unchanged.
+    """
+    from calculation import Calculations
+
+    store = None
+    if args.store:
+        from columnar_store import ColumnarStore
+        store = ColumnarStore(args.store)
+
+    calculations = Calculations(read_input(args.train, 'train', store), read_input(args.ideal, 'ideal', store),
+                                None, instrumentation=instrumentation)
+    criteria_kwargs = {'mode': 'parallel', 'workers': args.workers} if args.workers > 1 else {}
+    if args.cache_dir:
+        from calculation_cache import CalculationCache
+        CalculationCache(args.cache_dir).compute(calculations, **criteria_kwargs)
+    else:
+        calculations.calculate_criteria1(**criteria_kwargs)
+        calculations.deviations()
+    return calculations
+
+
+def write_scores(calculations, path):
+    """
+    Writes the SSD sums, top ideal functions and adjusted deviations as JSON.
+    """
+    with open(path, 'w') as scores_file:
+        json.dump({
+            'top_ideal_functions': calculations.get_top_four_ideal_functions(),
+            'adjusted_deviations': {func: float(dev) for func, dev in calculations.get_adjusted_deviation().items()},
+            'ssd_sums': {train_func: {ideal_func: float(ssd) for ideal_func, ssd in sums.items()}
+                         for train_func, sums in calculations.get_ssd_sums().items()}
+        }, scores_file, indent=2)
+    print(f'Scores written to {path}')
+
+
+def session_from_args(args):
+    """
+    Returns a DatabaseSession for the SQLAlchemy URL or the SQL Server settings given on the command line.
+    """
+    from db_session import DatabaseSession
+    if args.url:
+        return DatabaseSession(url=args.url)
+    return DatabaseSession(args.server, args.database, args.username, args.password, args.driver, args.port)
+
+
+def command_load(args, instrumentation):
+    """
+    Creates the database and tables and copies the CSV files into them.
+    """
+    from connection_ms_sql import CreateDatabaseTable, table_definitions
+    from read_csv_save_data_ms_sql import ReadCsv
+
+    dataset_path = args.dataset_path
+    file_to_table_map = {'train.csv': 'train_table', 'test.csv': 'test_table', 'ideal.csv': 'ideal_table'}
+    with open(os.path.join(dataset_path, 'train.csv'), 'r') as csvfile:
+        n_train = len(csvfile.readline().split(',')) - 1
+    with open(os.path.join(dataset_path, 'ideal.csv'), 'r') as csvfile:
+        n_ideal = len(csvfile.readline().split(',')) - 1
+    tabels = table_definitions(n_train, n_ideal)
+
+    session = session_from_args(args)
+    db_creator = CreateDatabaseTable(args.server, args.database, args.username, args.password, args.driver, args.port,
+                                     tabels, session=session, instrumentation=instrumentation)
+    db_creator.create_database()
+    db_creator.create_tables()
+    db_copy = ReadCsv(args.server, args.database, args.username, args.password, args.driver, args.port, dataset_path,
+                      list(file_to_table_map), tabels, file_to_table_map, session=session, instrumentation=instrumentation)
+    db_copy.read_csv_to_sql(bulk=args.bulk, workers=args.load_workers)
+    return 0 if all(report['error'] is None for report in db_copy.load_report.values()) else 1
+
+
+def command_score(args, instrumentation):
+    """
+    Computes the SSD search and deviations and writes them as JSON.
+    """
+    write_scores(compute_scores(args, instrumentation), args.output)
+    return 0
+
+
+def command_match(args, instrumentation):
+    """
+    Classifies the test points and writes the results to a CSV file and optionally to SQL.
+    """
+    import pandas as pd
+
+    calculations = compute_scores(args, instrumentation)
+    if args.scores:
+        write_scores(calculations, args.scores)
+
+    if args.chunksize:
+        # Stream the test file so memory stays bounded by the chunk size; rows keep the order of the file
+        test_chunks = pd.read_csv(args.test, names=['X (test func)', 'Y (test func)'], header=0, usecols=[0, 1],
+                                  chunksize=args.chunksize)
+        with instrumentation.stage('match') as record:
+            record['rows'] = calculations.write_results_stream(
+                calculations.classify_stream(test_chunks, args.match, args.tolerance), path=args.output)
+    else:
+        df_test = read_input(args.test, 'test')
+        with instrumentation.stage('match', rows=len(df_test)):
+            df_test_results = calculations.classify(df_test, args.match, args.tolerance).sort_values(by='X (test func)')
+            df_test_results.to_csv(args.output, index=False)
+    print(f'Test results written to {args.output}')
+
+    if args.to_sql:
+        from read_csv_save_data_ms_sql import ReadCsv
+
+        db_copy = ReadCsv(args.server, args.database, args.username, args.password, args.driver, args.port, '.',
+                          [], {}, {}, session=session_from_args(args), instrumentation=instrumentation)
+        db_copy.write_test_results_incremental(calculations, read_input(args.test, 'test'),
+                                               match=args.match, tolerance=args.tolerance)
+    return 0
+
+
+def command_render(args, instrumentation):
+    """
+    Renders the dashboard HTML from the scores JSON and the test results CSV.
+    """
+    import pandas as pd
+    from ploting import Plot
+
+    with open(args.scores, 'r') as scores_file:
+        ssd_sums = json.load(scores_file)['ssd_sums']
+    df_test_results = pd.read_csv(args.results)
+    plot = Plot(ssd_sums, df_test_results, large_data=len(df_test_results) > args.point_budget,
+                point_budget=args.point_budget, instrumentation=instrumentation)
+    plot.dashboard(heatmap=args.heatmap, top_k=args.top_k, filename=args.output, show_layout=args.show)
+    print(f'Dashboard written to {args.output}')
+    return 0
+
+
+def build_parser():
+    """
+    Returns the argument parser with the load, score, match and render subcommands.
+    """
+    parser = argparse.ArgumentParser(description='Select ideal functions for training data and classify test data.')
+    parser.add_argument('--metrics', help='Write stage timings and rows processed as JSON to this file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    database = argparse.ArgumentParser(add_help=False)
+    database.add_argument('--url', help='SQLAlchemy URL, e.g. sqlite:///assignment.db, instead of the SQL Server settings')
+    database.add_argument('--server', help='SQL Server name or address')
+    database.add_argument('--database', default='Assignment', help='Database name')
+    database.add_argument('--username', help='SQL Server username')
+    database.add_argument('--password', default=os.environ.get('ASSIGNMENT_DB_PASSWORD'),
+                          help='SQL Server password, defaults to $ASSIGNMENT_DB_PASSWORD')
+    database.add_argument('--driver', default='ODBC Driver 17 for SQL Server', help='ODBC driver')
+    database.add_argument('--port', default='1433', help='SQL Server port')
+
+    compute = argparse.ArgumentParser(add_help=False)
+    compute.add_argument('--train', default='train.csv', help='Training data CSV')
+    compute.add_argument('--ideal', default='ideal.csv', help='Ideal functions CSV')
+    compute.add_argument('--store', help='Directory of a columnar store to memory-map the inputs from')
+    compute.add_argument('--cache-dir', help='Directory of the result cache, reused while the inputs are unchanged')
+    compute.add_argument('--workers', type=int, default=1, help='Worker processes for the SSD search')
+
+    load = subparsers.add_parser('load', parents=[database], help='Copy the CSV files into the database')
+    load.add_argument('--dataset-path', default='.', help='Directory containing train.csv, test.csv and ideal.csv')
+    load.add_argument('--bulk', action='store_true', help='Load in batched chunks into the typed tables')
+    load.add_argument('--load-workers', type=int, default=1, help='Files loaded concurrently')
+    load.set_defaults(func=command_load)
+
+    score = subparsers.add_parser('score', parents=[compute], help='Select the ideal functions and compute their deviations')
+    score.add_argument('--output', default='scores.json', help='JSON file for the scores')
+    score.set_defaults(func=command_score)
+
+    match = subparsers.add_parser('match', parents=[compute, database], help='Classify the test data')
+    match.add_argument('--test', default='test.csv', help='Test data CSV')
+    match.add_argument('--output', default='test_results.csv', help='CSV file for the test results')
+    match.add_argument('--scores', help='Also write the scores as JSON to this file')
+    match.add_argument('--match', choices=['exact', 'nearest', 'interpolate'], default='exact', help='How test X values are looked up')
+    match.add_argument('--tolerance', type=float, help='Largest distance to the closest ideal X for nearest and interpolate')
+    match.add_argument('--chunksize', type=int, help='Stream the test data in chunks of this many rows')
+    match.add_argument('--to-sql', action='store_true', help='Append new results to the test_results table')
+    match.set_defaults(func=command_match)
+
+    render = subparsers.add_parser('render', help='Render the dashboard HTML')
+    render.add_argument('--scores', default='scores.json', help='Scores JSON written by score or match')
+    render.add_argument('--results', default='test_results.csv', help='Test results CSV written by match')
+    render.add_argument('--output', default='dahboard.html', help='HTML file for the dashboard')
+    render.add_argument('--heatmap', action='store_true', default=None, help='Show the SSD heatmap instead of bar plots')
+    render.add_argument('--top-k', type=int, help='Zoom the SSD heatmap to the top-k ideal functions')
+    render.add_argument('--point-budget', type=int, default=50000, help='Downsample the scatter plot above this many points')
+    render.add_argument('--show', action='store_true', help='Open the dashboard in a browser')
+    render.set_defaults(func=command_render)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    from instrumentation import Instrumentation
+
+    instrumentation = Instrumentation(enabled=bool(args.metrics))
+    status = args.func(args, instrumentation)
+    if args.metrics:
+        instrumentation.write_json(args.metrics)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
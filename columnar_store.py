@@ -0,0 +1,108 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnarStore:
+    """
+    A binary columnar store for the numeric CSV inputs of the pipeline.
+
+    Every input is stored once as a column-major float64 `.npy` matrix next to a small JSON file with its column
+    names and the size and modification time of the source CSV. Later loads memory-map the matrix, so no text is parsed
+    and the DataFrame is a view on the file instead of a copy. A changed source file is detected from its size
+    and modification time and the entry is rebuilt.
+
+    Attributes:
+        store_dir (str): Directory holding one `.npy` and one `.json` file per stored input.
+
+    Methods:
+        save(name, df, source_path=None): Stores the numeric DataFrame `df` under `name`.
+
+        load(name): Returns the DataFrame stored under `name`, memory-mapped from disk.
+
+        is_current(name, source_path, columns): Returns True if `name` is stored with `columns` and is up to date with `source_path`.
+
+        load_csv(csv_path, columns, name=None): Loads a CSV file through the store, building or refreshing its entry when needed.
+    """
+
+    def __init__(self, store_dir='.columnar_store'):
+        """
+        Initializes the store and creates the store directory if it does not exist.
+        """
+        self.store_dir = store_dir
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def _paths(self, name):
+        """
+        Returns the paths of the matrix and metadata files of `name`.
+        """
+        return os.path.join(self.store_dir, f'{name}.npy'), os.path.join(self.store_dir, f'{name}.json')
+
+    @staticmethod
+    def _source_signature(source_path):
+        """
+        Returns the size and modification time of a source file, used to detect changes.
+        """
+        stat = os.stat(source_path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def save(self, name, df, source_path=None):
+        """
+        Stores the numeric DataFrame `df` under `name` as a column-major float64 matrix.
+        """
+        matrix_path, meta_path = self._paths(name)
+        # Frames returned by earlier loads may still map the old matrix. Writing to a temporary file and replacing
+        # the old one leaves their mapping on the old file instead of truncating or overwriting it under them.
+        tmp_matrix_path = f'{matrix_path}.{os.getpid()}.tmp'
+        with open(tmp_matrix_path, 'wb') as matrix_file:
+            # Column-major, so every column and any run of columns such as the Y block after X is one contiguous slice
+            np.save(matrix_file, np.asfortranarray(df.to_numpy(dtype=np.float64)))
+        os.replace(tmp_matrix_path, matrix_path)
+
+        meta = {
+            'columns': list(df.columns),
+            'source': self._source_signature(source_path) if source_path else None
+        }
+        tmp_meta_path = f'{meta_path}.{os.getpid()}.tmp'
+        with open(tmp_meta_path, 'w') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(tmp_meta_path, meta_path)
+
+    def load(self, name):
+        """
+        Returns the DataFrame stored under `name`. The data is memory-mapped read-only and not copied.
+        """
+        matrix_path, meta_path = self._paths(name)
+        with open(meta_path, 'r') as meta_file:
+            meta = json.load(meta_file)
+        matrix = np.load(matrix_path, mmap_mode='r')
+        return pd.DataFrame(matrix, columns=meta['columns'], copy=False)
+
+    def is_current(self, name, source_path, columns):
+        """
+        Returns True if `name` is stored with the given columns and the source file has not changed since.
+        """
+        matrix_path, meta_path = self._paths(name)
+        if not (os.path.exists(matrix_path) and os.path.exists(meta_path)):
+            return False
+        with open(meta_path, 'r') as meta_file:
+            meta = json.load(meta_file)
+        return meta['columns'] == list(columns) and meta['source'] == self._source_signature(source_path)
+
+    def load_csv(self, csv_path, columns, name=None):
+        """
+        Returns the CSV file at `csv_path` with the given column names, parsing it only if the store holds
+        no up-to-date copy.
+
+        Parameters:
+            csv_path (str): Path of the CSV file. Its header row is replaced by `columns`.
+            columns (list of str): Column names to use.
+            name (str, optional): Name of the entry in the store, defaults to the file name without extension.
+        """
+        name = name or os.path.splitext(os.path.basename(csv_path))[0]
+        if not self.is_current(name, csv_path, columns):
+            df = pd.read_csv(csv_path, names=columns, header=0)
+            self.save(name, df, source_path=csv_path)
+        return self.load(name)
@@ -1,8 +1,24 @@
-import pyodbc
+from sqlalchemy import inspect, text
+
+from db_session import DatabaseSession
+from instrumentation import Instrumentation, instrumented
+
+
+def table_definitions(n_train, n_ideal):
+    """
+    Returns the table definitions in the format of `tabels_dic` for the given number of training and ideal functions.
+    """
+    return {
+        "train_table": [('X', 'FLOAT')] + [(f'Y{i} (training func)', 'FLOAT') for i in range(1, n_train + 1)],
+        "test_table": [('X (test func)', 'FLOAT'), ('Y (test func)', 'FLOAT'), ('Delta Y (test func)', 'FLOAT'), ('No. of ideal func', 'VARCHAR(255)')],
+        "ideal_table": [('X', 'FLOAT')] + [(f'Y{i} (ideal func)', 'FLOAT') for i in range(1, n_ideal + 1)],
+    }
+
 
 class CreateDatabaseTable:
     """
-    A class to manage the creation of a database and its tables in Microsft SQL Server using pyodbc.
+    A class to manage the creation of a database and its tables in Microsft SQL Server using a pooled
+    `DatabaseSession` (SQLAlchemy with pyodbc).
 
     Attributes:
         server (str): The server name or IP address where the SQL Server instance is hosted.
@@ -13,17 +29,19 @@ class CreateDatabaseTable:
         port (int): The port number for the SQL Server instance.
         tables (dict): A dictionary where keys are table names and values are lists of tuples,
                        each tuple containing the column name and data type.
+        session (DatabaseSession): The session providing pooled connections. Built from the settings above
+                                   unless one is passed in, e.g. to share it with `ReadCsv` or to use SQLite.
     
     Methods:
         create_database(): Attempts to create the database specified in the `database_name` attribute.
                            Prints a success message or indicates if the database already exists.
                            
-        create_tables(): Attempts to create tables specified in the `tables` attribute within the
-                         previously created database. Prints a success message for each table created
-                         or indicates if a table already exists.
+        create_tables(): Creates the tables specified in the `tables` attribute that do not exist yet
+                         within the previously created database, in a single transaction. Prints a success
+                         message for each table created or indicates if a table already exists.
     """
     
-    def __init__(self, server, database_name, username, password, driver, port, tabels):
+    def __init__(self, server, database_name, username, password, driver, port, tabels, session=None, instrumentation=None):
         """
         Initializes the CreateDatabaseTable class with server details, authentication credentials,
         and table definitions.
@@ -35,54 +53,55 @@ class CreateDatabaseTable:
         self.driver = driver
         self.port = port
         self.tabels = tabels
+        self.session = session or DatabaseSession(server, database_name, username, password, driver, port)
+        self.instrumentation = instrumentation or Instrumentation(enabled=False)
 
+    @instrumented('create_database')
     def create_database(self):
         """
         Attempts to create the database on the server. If the database already exists,
-        it catches the exception and prints a message.
+        it prints a message.
         """
-        # Connection string without specifying the database
-        initial_conn_str = f'DRIVER={{{self.driver}}};SERVER={self.server};UID={self.username};PWD={self.password};Port={self.port};TrustServerCertificate=yes;'
+        if self.session.dialect() != 'mssql':
+            # Databases such as SQLite are created on first connection
+            print(f"Database '{self.database_name}' is created on first use for {self.session.dialect()}")
+            return
 
-        # Attempt to create the database
+        # Attempt to create the database, CREATE DATABASE cannot run inside a transaction
         try:
-            with pyodbc.connect(initial_conn_str, autocommit=True) as conn:
-                with conn.cursor() as cursor:
-                    try:
-                        cursor.execute(f"CREATE DATABASE {self.database_name}")
-                        print(f"Database '{self.database_name}' created successfully.")
-                    except Exception as d:
-                        print(f'Database "{self.database_name}" already exist')
+            with self.session.server_engine().connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                if conn.execute(text("SELECT DB_ID(:name)"), {'name': self.database_name}).scalar() is not None:
+                    print(f'Database "{self.database_name}" already exist')
+                else:
+                    conn.execute(text(f"CREATE DATABASE [{self.database_name}]"))
+                    print(f"Database '{self.database_name}' created successfully.")
         except Exception as e:
             print(f'Connection or another error occurred: {e}')
             
+    @instrumented('create_tables', rows=lambda self, *args, **kwargs: len(self.tabels))
     def create_tables(self): 
         """
-        Connects to the database and attempts to create the tables as defined in the 'tables' attribute.
-        If a table already exists, it catches the exception and prints a message.
+        Connects to the database and creates the tables defined in the 'tables' attribute that do not exist yet.
+        All CREATE TABLE statements run in one transaction, so either all missing tables are created or none.
         """   
-        # Connection string updated with database name after creation of database
-        conn_str = f'DRIVER={{{self.driver}}};SERVER={self.server};DATABASE={self.database_name};UID={self.username};PWD={self.password};Port={self.port};TrustServerCertificate=yes;'
-        
         # Definitions for tables
         tabels = self.tabels
 
         try:
-            with pyodbc.connect(conn_str, autocommit=True) as conn:
-                    with conn.cursor() as cursor:
-                            for table_name, columns in tabels.items():
-                                try:
-                                    create_table_command = f"CREATE TABLE {table_name} ("
-                                    col_definitions = [f"[{col_name}] {data_type}" for col_name, data_type in columns]
-                                    create_table_command += ", ".join(col_definitions)
-                                    create_table_command += ")"
-                                    
-                                    # Execute the CREATE TABLE command
-                                    cursor.execute(create_table_command)
-                                    print(f"Table '{table_name}' created successfully.")
-                                    
-                                except Exception as d:
-                                    print(f"Table '{table_name}' Already Present: {d}")
+            existing_tables = set(inspect(self.session.engine()).get_table_names())
+            create_table_commands = []
+            for table_name, columns in tabels.items():
+                if table_name in existing_tables:
+                    print(f"Table '{table_name}' Already Present")
+                    continue
+                col_definitions = [f"[{col_name}] {data_type}" for col_name, data_type in columns]
+                create_table_commands.append(f"CREATE TABLE {table_name} ({', '.join(col_definitions)})")
+
+            # Execute the CREATE TABLE commands as one batch
+            self.session.execute_batch(create_table_commands)
+            for table_name in tabels:
+                if table_name not in existing_tables:
+                    print(f"Table '{table_name}' created successfully.")
         except Exception as e:
             print(f"An connection error occurred while creating tables: {e}")
         
@@ -0,0 +1,132 @@
+import threading
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL, make_url
+
+
+class DatabaseSession:
+    """
+    A connection manager shared by `CreateDatabaseTable` and `ReadCsv`.
+
+    Engines are kept in a process-wide registry keyed by connection URL and pool settings, so every part of
+    the pipeline that talks to the same server reuses one engine and its connection pool instead of opening
+    new connections. By default the session connects to Microsoft SQL Server through pyodbc; passing `url`
+    points it at any other SQLAlchemy database, e.g. a local SQLite file for tests.
+
+    Attributes:
+        server (str): Server address of the SQL database.
+        database_name (str): Name of the database to connect to.
+        username (str): Username for database authentication.
+        password (str): Password for database authentication.
+        driver (str): ODBC driver used for the connection.
+        port (str): Port number for the database server.
+        url (str, optional): SQLAlchemy URL used instead of the SQL Server settings above.
+        pool_size (int): Number of connections kept open in the pool.
+        max_overflow (int): Number of connections allowed beyond `pool_size` under load.
+        pool_recycle (int): Seconds after which pooled connections are replaced.
+        pool_pre_ping (bool): Check pooled connections before use so dropped connections are replaced transparently.
+        fast_executemany (bool): Send executemany batches in one round trip on SQL Server.
+
+    Methods:
+        dialect(): Returns the name of the database backend, e.g. 'mssql' or 'sqlite'.
+
+        engine(): Returns the pooled engine for the database `database_name`.
+
+        server_engine(): Returns the pooled engine for the server without a database, used to create databases.
+
+        execute_batch(statements): Executes a list of SQL statements in a single transaction.
+
+        dispose_all(): Closes all pooled connections of all sessions.
+    """
+
+    _engines = {}
+    _engines_lock = threading.Lock()
+
+    def __init__(self, server=None, database_name=None, username=None, password=None, driver=None, port=None,
+                 url=None, pool_size=5, max_overflow=10, pool_recycle=1800, pool_pre_ping=True, fast_executemany=True):
+        """
+        Initializes the session with server details or a SQLAlchemy URL and pool settings.
+        """
+        self.server = server
+        self.database_name = database_name
+        self.username = username
+        self.password = password
+        self.driver = driver
+        self.port = port
+        self.url = url
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self.pool_pre_ping = pool_pre_ping
+        self.fast_executemany = fast_executemany
+
+    def _url(self, database):
+        """
+        Returns the connection URL for `database`, or for the server alone if `database` is None.
+        """
+        if self.url is not None:
+            return make_url(self.url)
+        return URL.create(
+            'mssql+pyodbc',
+            username=self.username,
+            password=self.password,
+            host=self.server,
+            database=database,
+            query={'driver': self.driver, 'TrustServerCertificate': 'yes'}
+        )
+
+    def dialect(self):
+        """
+        Returns the name of the database backend, e.g. 'mssql' or 'sqlite'.
+        """
+        return self._url(self.database_name).get_backend_name()
+
+    def _get_engine(self, database):
+        """
+        Returns the engine for `database` from the registry, creating it on first use.
+        """
+        url = self._url(database)
+        options = {'pool_pre_ping': self.pool_pre_ping, 'pool_recycle': self.pool_recycle}
+        if url.get_backend_name() != 'sqlite':
+            # SQLite uses a file or in-memory pool without size limits
+            options.update(pool_size=self.pool_size, max_overflow=self.max_overflow)
+        if url.get_backend_name() == 'mssql':
+            options['fast_executemany'] = self.fast_executemany
+
+        key = (url.render_as_string(hide_password=False), tuple(sorted(options.items())))
+        with DatabaseSession._engines_lock:
+            if key not in DatabaseSession._engines:
+                DatabaseSession._engines[key] = create_engine(url, **options)
+            return DatabaseSession._engines[key]
+
+    def engine(self):
+        """
+        Returns the pooled engine for the database `database_name`.
+        """
+        return self._get_engine(self.database_name)
+
+    def server_engine(self):
+        """
+        Returns the pooled engine for the server without selecting a database, used to create databases.
+        For a database given by `url` this is the same engine as `engine()`.
+        """
+        return self._get_engine(None if self.url is None else self.database_name)
+
+    def execute_batch(self, statements):
+        """
+        Executes a list of SQL statements on `database_name` in a single transaction.
+        If one statement fails, none of them is applied.
+        """
+        with self.engine().begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+
+    @classmethod
+    def dispose_all(cls):
+        """
+        Closes all pooled connections of all sessions and empties the registry.
+        """
+        with cls._engines_lock:
+            for engine in cls._engines.values():
+                engine.dispose()
+            cls._engines.clear()
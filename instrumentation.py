@@ -0,0 +1,159 @@
+import functools
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger('pipeline.metrics')
+
+
+class Instrumentation:
+    """
+    Records wall time, rows processed, throughput and peak memory for the stages of a pipeline run.
+
+    Every finished stage produces a record that is logged through the 'pipeline.metrics' logger and passed
+    to each registered hook, e.g. to forward it to a monitoring system. All records of a run can be exported
+    as a JSON summary. A disabled instance records nothing and adds no measurable overhead, which is the
+    default for `Calculations`, `ReadCsv`, `CreateDatabaseTable` and `Plot`.
+
+    Attributes:
+        hooks (list of callable): Functions called with the record of every finished stage.
+        trace_memory (bool): Measure the peak memory allocated by Python and NumPy per stage with tracemalloc.
+                             This slows down allocation-heavy stages, so it is off by default.
+                             tracemalloc is process-wide, so stages running concurrently in threads share their peak.
+        enabled (bool): Record stages at all.
+        records (list of dict): Records of the finished stages in the order they finished.
+
+    Methods:
+        add_hook(hook): Registers a function called with the record of every finished stage.
+
+        stage(name, rows=None): Context manager measuring the enclosed block as a stage.
+
+        summary(): Returns the records of the run with its start time and total wall time.
+
+        write_json(path): Writes the summary to a JSON file.
+    """
+
+    def __init__(self, hooks=None, trace_memory=False, enabled=True):
+        """
+        Initializes the instrumentation for a new run.
+        """
+        self.hooks = list(hooks or [])
+        self.trace_memory = trace_memory
+        self.enabled = enabled
+        self.records = []
+        self.started_at = datetime.now(timezone.utc)
+        self._start_time = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add_hook(self, hook):
+        """
+        Registers a function called with the record of every finished stage.
+        """
+        self.hooks.append(hook)
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Measures the enclosed block as the stage `name`. The yielded record can be updated inside the block,
+        e.g. `record['rows'] = len(df)` when the number of rows is only known at the end.
+        Nested stages are recorded separately and the outer stage includes their time and memory.
+        """
+        record = {'stage': name, 'rows': rows}
+        if not self.enabled:
+            yield record
+            return
+
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                record['_started_tracing'] = True
+            elif stack:
+                # Keep the peak reached so far by the enclosing stage before resetting it for this one
+                stack[-1]['_peak'] = max(stack[-1].get('_peak', 0), tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(record)
+
+        start_time = time.perf_counter()
+        try:
+            yield record
+            record['error'] = None
+        except Exception as e:
+            record['error'] = repr(e)
+            raise
+        finally:
+            record['seconds'] = time.perf_counter() - start_time
+            stack.pop()
+            record['peak_memory_bytes'] = None
+            if self.trace_memory:
+                peak = max(record.pop('_peak', 0), tracemalloc.get_traced_memory()[1])
+                record['peak_memory_bytes'] = peak
+                if stack:
+                    stack[-1]['_peak'] = max(stack[-1].get('_peak', 0), peak)
+                if record.pop('_started_tracing', False):
+                    tracemalloc.stop()
+            rows = record['rows']
+            record['rows_per_second'] = rows / record['seconds'] if rows and record['seconds'] > 0 else None
+            self._finish(record)
+
+    def _finish(self, record):
+        """
+        Stores a finished record, logs it and passes it to the hooks.
+        """
+        with self._lock:
+            self.records.append(record)
+        logger.info(
+            "stage=%s seconds=%.4f rows=%s rows_per_second=%s peak_memory_bytes=%s",
+            record['stage'], record['seconds'], record['rows'],
+            None if record['rows_per_second'] is None else f"{record['rows_per_second']:.0f}",
+            record['peak_memory_bytes']
+        )
+        for hook in self.hooks:
+            hook(record)
+
+    def summary(self):
+        """
+        Returns the records of the run together with its start time and total wall time.
+        """
+        with self._lock:
+            records = list(self.records)
+        return {
+            'started_at': self.started_at.isoformat(),
+            'total_seconds': time.perf_counter() - self._start_time,
+            'stages': records
+        }
+
+    def write_json(self, path):
+        """
+        Writes the summary of the run to a JSON file.
+        """
+        with open(path, 'w') as summary_file:
+            json.dump(self.summary(), summary_file, indent=2)
+
+
+def instrumented(stage_name, rows=None):
+    """
+    Decorator recording a method as a stage of the `instrumentation` attribute of its instance.
+
+    Parameters:
+        stage_name (str): Name of the stage.
+        rows (callable, optional): Called with the instance and the arguments of the method after it returned,
+                                   to get the number of rows processed.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.instrumentation.stage(stage_name) as record:
+                result = method(self, *args, **kwargs)
+                if rows is not None:
+                    record['rows'] = rows(self, *args, **kwargs)
+            return result
+        return wrapper
+    return decorator
@@ -1,7 +1,10 @@
 from bokeh.plotting import figure, show, output_file, save
-from bokeh.models import ColumnDataSource, HoverTool
+from bokeh.models import ColumnDataSource, HoverTool, LinearColorMapper, ColorBar, FixedTicker
 from bokeh.layouts import gridplot
+from bokeh.palettes import Category20
 import numpy as np
+import pandas as pd
+from instrumentation import Instrumentation, instrumented
 from bokeh.layouts import column, row
 
 class Plot:
@@ -11,21 +14,30 @@ class Plot:
         Attributes:
             ssd_sums (dict): A dictionary containing the sums of squared differences (SSD) for each training function against ideal functions.
             test_results (DataFrame): A pandas DataFrame containing test results with columns for 'X (test func)', 'Y (test func)', 'Delta Y (test func)', and 'No. of ideal func'.
+            large_data (bool): Render the scatter plot for large test sets: WebGL output, colours by ideal function and downsampling above `point_budget`.
+            point_budget (int): Maximum number of points drawn in the scatter plot in large data mode.
+            instrumentation (Instrumentation): Records the time taken to render the plots. Disabled unless one is passed in.
         
         Methods:
             ssd_plot(ssd_sums, title): Creates a bar plot for SSD values with the minimum SSD highlighted.
             scatter_test_results(df_test_results): Generates a scatter plot for test results, showing ideal function number and Delta Y on hover.
-            dashboard(): Creates a comprehensive layout with SSD bar plots and a scatter plot of test results, then saves and displays it as an HTML file.
-            ssd_plot_only(): Displays only the SSD bar plots for each training function in a layout.
+            downsample(df_test_results, point_budget): Reduces the test results to at most `point_budget` points, keeping one point per occupied grid cell and ideal function.
+            ssd_heatmap(ssd_sums, top_k=None): Creates a heatmap of the log10 SSD matrix of all training and ideal functions with the minimum per training function outlined.
+            ssd_panels(heatmap=None, top_k=None): Returns the SSD bar plots of all training functions, or the SSD heatmap for large catalogues.
+            dashboard(heatmap=None, top_k=None, filename="dahboard.html", show_layout=True): Creates a comprehensive layout with SSD plots and a scatter plot of test results, then saves and displays it as an HTML file.
+            ssd_plot_only(heatmap=None, top_k=None): Displays only the SSD plots for each training function in a layout.
             scatter_plot_only(): Displays only the scatter plot of test results in a layout.
         """
     
-        def __init__(self, ssd_sums, test_results):
+        def __init__(self, ssd_sums, test_results, large_data=False, point_budget=50000, instrumentation=None):
             """
             Initializes the Plot class with SSD sums and test results data.
             """
             self.ssd_sums = ssd_sums
             self.test_results = test_results
+            self.large_data = large_data
+            self.point_budget = point_budget
+            self.instrumentation = instrumentation or Instrumentation(enabled=False)
         
         def ssd_plot(self,ssd_sums, title):
             """
@@ -76,6 +88,7 @@ class Plot:
 
             """
             Creates a scatter plot of test results, showing the relationship between 'X (test func)' and 'Y (test func)' and displaying the ideal function number and Delta Y on hover.
+            In large data mode the points are downsampled, coloured by ideal function and rendered with WebGL.
 
             Parameters:
                 df_test_results (DataFrame): A DataFrame containing test results.
@@ -84,9 +97,14 @@ class Plot:
                 Bokeh figure: A scatter plot visualizing the test results.
             """
 
-            # Generate a random color for each data point
+            if self.large_data:
+                return self._scatter_large_data(df_test_results)
+
+            # Generate a random color for each data point, drawing all hex digits in one call
             np.random.seed(42)  # For reproducibility
-            colors = ['#' + ''.join([np.random.choice(list('0123456789ABCDEF')) for j in range(6)]) for i in range(len(df_test_results))]
+            hex_digits = np.array(list('0123456789ABCDEF'))
+            digits = hex_digits[np.random.randint(0, 16, size=(len(df_test_results), 6))]
+            colors = np.char.add('#', digits.view('<U6').ravel())
 
             # Prepare the data
             source = ColumnDataSource(data={
@@ -120,79 +138,209 @@ class Plot:
             # Return the plot object
             return p
     
-        def dashboard(self):
+        def downsample(self, df_test_results, point_budget):
             """
-            Combines SSD bar plots for each training function and a scatter plot of test results into a single dashboard layout and saves/shows it as an HTML file.
+            Reduces the test results to at most `point_budget` points while keeping the shape of the point cloud.
+            The plot area is divided into a grid and one point is kept per occupied cell and ideal function,
+            so sparse regions stay visible while dense regions are thinned.
+
+            Parameters:
+                df_test_results (DataFrame): A DataFrame containing test results.
+                point_budget (int): Maximum number of points to keep.
+
+            Returns:
+                DataFrame: The kept rows with an additional 'points' column counting the rows each one represents.
+            """
+            if len(df_test_results) <= point_budget:
+                return df_test_results.assign(points=1)
+
+            x = df_test_results['X (test func)'].to_numpy(dtype=float)
+            y = df_test_results['Y (test func)'].to_numpy(dtype=float)
+            func_codes = pd.factorize(df_test_results['No. of ideal func'], use_na_sentinel=False)[0]
+
+            bins = max(int(np.sqrt(point_budget)), 1)
+            def bin_index(values):
+                span = np.nanmax(values) - np.nanmin(values)
+                scaled = (values - np.nanmin(values)) / (span if span > 0 else 1) * bins
+                return np.clip(np.nan_to_num(scaled), 0, bins - 1).astype(np.int64)
+
+            cell = (bin_index(x) * bins + bin_index(y)) * (func_codes.max() + 1) + func_codes
+            _, first_rows, counts = np.unique(cell, return_index=True, return_counts=True)
+
+            if len(first_rows) > point_budget:
+                # More occupied cells than the budget allows: keep a reproducible random subset of them,
+                # drawn with probability proportional to the rows in each cell so dense regions are kept
+                keep = np.random.default_rng(42).choice(len(first_rows), size=point_budget, replace=False,
+                                                        p=counts / counts.sum())
+                first_rows, counts = first_rows[keep], counts[keep]
+            return df_test_results.iloc[first_rows].assign(points=counts)
+
+        def _scatter_large_data(self, df_test_results):
+            """
+            Creates the scatter plot of test results for large data: points are downsampled to `point_budget`,
+            coloured by ideal function and rendered with WebGL. Marker size and opacity grow with the log of the
+            number of rows each kept point represents.
+            """
+            df_plot = self.downsample(df_test_results, self.point_budget)
+
+            # Map every ideal function to a palette colour, points without a matching function are grey
+            func_codes, funcs = pd.factorize(df_plot['No. of ideal func'])
+            palette = np.array(Category20[20])
+            colors = np.where(func_codes >= 0, palette[func_codes % len(palette)], 'lightgrey')
+
+            source = ColumnDataSource(data={
+                'x_test': df_plot['X (test func)'].to_numpy(dtype=float),
+                'y_test': df_plot['Y (test func)'].to_numpy(dtype=float),
+                'ideal_func': df_plot['No. of ideal func'].to_numpy(),
+                'delta_y': df_plot['Delta Y (test func)'].to_numpy(),
+                'points': df_plot['points'].to_numpy(),
+                'sizes': np.clip(4 + 2 * np.log2(df_plot['points'].to_numpy(dtype=float)), 4, 20),
+                'alphas': np.clip(0.3 + 0.1 * np.log2(df_plot['points'].to_numpy(dtype=float)), 0.3, 0.9),
+                'colors': colors
+            })
+
+            p = figure(width=1400, height=600, output_backend='webgl',
+                    title=f"Test Results Scatter Plot ({len(df_plot):,} of {len(df_test_results):,} points shown)",
+                    x_axis_label='X (test func)', y_axis_label='Y (test func)',
+                    tools="pan,wheel_zoom,box_zoom,reset,save")
+            p.scatter('x_test', 'y_test', color='colors', source=source, size='sizes', alpha='alphas')
+
+            hover = HoverTool()
+            hover.tooltips = [
+                ("X (test func)", "@x_test"),
+                ("Y (test func)", "@y_test"),
+                ("No. of ideal func", "@ideal_func"),
+                ("Delta Y", "@delta_y"),
+                ("Points in cell", "@points")
+            ]
+            p.add_tools(hover)
+            return p
+    
+        def ssd_heatmap(self, ssd_sums, top_k=None):
+            """
+            Creates a heatmap of the log10 SSD of every training function (rows) against every ideal function (columns),
+            built from a single array and sized to the number of functions. The ideal function with the minimum SSD
+            is outlined in each row.
+
+            Parameters:
+                ssd_sums (dict): SSD sums of all training functions, as returned by `Calculations.get_ssd_sums`.
+                top_k (int, optional): Only show the ideal functions that are among the k lowest SSD of any training function.
+
+            Returns:
+                Bokeh figure: A heatmap visualizing the SSD matrix.
+            """
+            training_funcs = list(ssd_sums.keys())
+            ideal_funcs = list(ssd_sums[training_funcs[0]].keys())
+            ssd_log = np.log10(np.array([[ssd_sums[train_func][ideal_func] for ideal_func in ideal_funcs] for train_func in training_funcs]))
+
+            if top_k is not None and top_k < len(ideal_funcs):
+                # Zoom in on the union of the top-k candidates of all training functions, in their original order
+                candidates = np.unique(np.argpartition(ssd_log, top_k - 1, axis=1)[:, :top_k])
+                ssd_log = ssd_log[:, candidates]
+                ideal_funcs = [ideal_funcs[i] for i in candidates]
+
+            n_train, n_ideal = ssd_log.shape
+            lowest = np.argmin(ssd_log, axis=1)
+
+            color_mapper = LinearColorMapper(palette='Viridis256', low=np.nanmin(ssd_log[np.isfinite(ssd_log)]), high=np.nanmax(ssd_log))
+            p = figure(x_range=(0, n_ideal), y_range=(0, n_train), width=1400, height=150 + 40 * n_train,
+                       title=f'Log10(SSD) of {n_train} training functions against {n_ideal} ideal functions',
+                       tools="pan,wheel_zoom,box_zoom,reset,save")
+            heatmap = p.image(image=[ssd_log], x=0, y=0, dw=n_ideal, dh=n_train, color_mapper=color_mapper)
+            p.add_layout(ColorBar(color_mapper=color_mapper, title='Log10(SSD)'), 'right')
+
+            # Outline the cell with the lowest SSD in each row
+            minima_source = ColumnDataSource(data=dict(
+                x=lowest + 0.5,
+                y=np.arange(n_train) + 0.5,
+                train_funcs=training_funcs,
+                ideal_funcs=[ideal_funcs[i] for i in lowest],
+                ssd=ssd_log[np.arange(n_train), lowest]
+            ))
+            minima = p.rect(x='x', y='y', width=1, height=1, source=minima_source, fill_alpha=0, line_color='red', line_width=2)
+
+            p.add_tools(HoverTool(renderers=[heatmap], tooltips=[("Log10(SSD)", "@image{0,0.00}")]))
+            p.add_tools(HoverTool(renderers=[minima], tooltips=[
+                ("Training Function", "@train_funcs"),
+                ("Selected Ideal Function", "@ideal_funcs"),
+                ("Log10(SSD)", "@ssd{0,0.00}")
+            ]))
+
+            # Label rows with the training functions, and columns with the ideal functions while they stay readable
+            p.yaxis.ticker = FixedTicker(ticks=list(np.arange(n_train) + 0.5))
+            p.yaxis.major_label_overrides = {j + 0.5: name for j, name in enumerate(training_funcs)}
+            if n_ideal <= 100:
+                p.xaxis.ticker = FixedTicker(ticks=list(np.arange(n_ideal) + 0.5))
+                p.xaxis.major_label_overrides = {i + 0.5: name for i, name in enumerate(ideal_funcs)}
+                p.xaxis.major_label_orientation = "vertical"
+            else:
+                p.xaxis.axis_label = 'Ideal function (column index)'
+            return p
+
+        def ssd_panels(self, heatmap=None, top_k=None):
+            """
+            Returns the SSD panels of the dashboard: a bar plot per training function arranged two per row,
+            or a single heatmap of all training and ideal functions.
+
+            Parameters:
+                heatmap (bool, optional): Use the heatmap. By default it is used for more than four training functions
+                                          or more than 60 ideal functions, where bar plots become unreadable.
+                top_k (int, optional): Zoom the heatmap to the top-k ideal functions, see `ssd_heatmap`.
+
+            Returns:
+                list: Bokeh layouts to stack vertically.
+            """
+            ssd_sums = self.ssd_sums
+            if heatmap is None:
+                heatmap = len(ssd_sums) > 4 or len(next(iter(ssd_sums.values()))) > 60
+            if heatmap:
+                return [self.ssd_heatmap(ssd_sums, top_k)]
+
+            plots = []
+            for train_func, ssd_sums_train in ssd_sums.items():
+                # The ideal function with the lowest SSD for this training function
+                lowest_ssd = min(ssd_sums_train, key=ssd_sums_train.get)
+                plots.append(self.ssd_plot(ssd_sums_train, f'SSD for {train_func}-Log Sclae & The Function selected is {lowest_ssd} @Value {ssd_sums_train[lowest_ssd]}'))
+
+            # Combine the plots two per row
+            return [row(*plots[i:i + 2]) for i in range(0, len(plots), 2)]
+
+        @instrumented('dashboard', rows=lambda self, *args, **kwargs: len(self.test_results))
+        def dashboard(self, heatmap=None, top_k=None, filename="dahboard.html", show_layout=True):
+            """
+            Combines SSD plots for each training function and a scatter plot of test results into a single dashboard layout and saves/shows it as an HTML file.
+            See `ssd_panels` for `heatmap` and `top_k`. With `show_layout` False the file is only saved, e.g. for headless runs.
             """
             df_test_results = self.test_results
-            ssd_sums= self.ssd_sums
             
-            ssd_sums_y1 = ssd_sums['Y1 (training func)']
-            ssd_sums_y2 = ssd_sums['Y2 (training func)']
-            ssd_sums_y3 = ssd_sums['Y3 (training func)']
-            ssd_sums_y4 = ssd_sums['Y4 (training func)']
-
-            # Example usage: Print the ideal function with the lowest SSD for Y1 (training func)
-            lowest_ssd_y1 = min(ssd_sums_y1, key=ssd_sums_y1.get)
-            lowest_ssd_y2 = min(ssd_sums_y2, key=ssd_sums_y2.get)
-            lowest_ssd_y3 = min(ssd_sums_y3, key=ssd_sums_y3.get)
-            lowest_ssd_y4 = min(ssd_sums_y4, key=ssd_sums_y4.get)
-            # Create a plot for each set of SSD sums
-            p1 = self.ssd_plot(ssd_sums['Y1 (training func)'], f'SSD for Y1 (training func)-Log Sclae & The Function selected is {lowest_ssd_y1} @Value {ssd_sums_y1[lowest_ssd_y1]}')
-            p2 = self.ssd_plot(ssd_sums['Y2 (training func)'], f'SSD for Y2 (training func)-Log Sclae & The Function selected is {lowest_ssd_y2} @Value {ssd_sums_y2[lowest_ssd_y2]}')
-            p3 = self.ssd_plot(ssd_sums['Y3 (training func)'], f'SSD for Y3 (training func)-Log Sclae & The Function selected is {lowest_ssd_y3} @Value {ssd_sums_y3[lowest_ssd_y3]}')
-            p4 = self.ssd_plot(ssd_sums['Y4 (training func)'], f'SSD for Y4 (training func)-Log Sclae & The Function selected is {lowest_ssd_y4} @Value {ssd_sums_y4[lowest_ssd_y4]}')
             p5 = self.scatter_test_results(df_test_results)
 
-           # Combine p1 and p2 in one row, and p3 and p4 in another row
-            top_row = row(p1, p2)
-            middle_row = row(p3, p4)
-
-            # Stack the two rows and the scatter plot vertically
-            layout = column(top_row, middle_row, p5)
+            # Stack the SSD panels and the scatter plot vertically
+            layout = column(*self.ssd_panels(heatmap, top_k), p5)
             
             # Specify the output file path
-            output_file("dahboard.html")
+            output_file(filename)
 
             # Save the layout
             save(layout)
 
             # Show the layout
-            show(layout)
+            if show_layout:
+                show(layout)
         
-        def ssd_plot_only(self):
+        @instrumented('ssd_plot_only')
+        def ssd_plot_only(self, heatmap=None, top_k=None):
             """
-            Creates and shows a layout consisting only of SSD bar plots for each training function.
+            Creates and shows a layout consisting only of the SSD plots for each training function.
+            See `ssd_panels` for `heatmap` and `top_k`.
             """
-            ssd_sums= self.ssd_sums
-            
-            ssd_sums_y1 = ssd_sums['Y1 (training func)']
-            ssd_sums_y2 = ssd_sums['Y2 (training func)']
-            ssd_sums_y3 = ssd_sums['Y3 (training func)']
-            ssd_sums_y4 = ssd_sums['Y4 (training func)']
-
-            # Example usage: Print the ideal function with the lowest SSD for Y1 (training func)
-            lowest_ssd_y1 = min(ssd_sums_y1, key=ssd_sums_y1.get)
-            lowest_ssd_y2 = min(ssd_sums_y2, key=ssd_sums_y2.get)
-            lowest_ssd_y3 = min(ssd_sums_y3, key=ssd_sums_y3.get)
-            lowest_ssd_y4 = min(ssd_sums_y4, key=ssd_sums_y4.get)
-            # Create a plot for each set of SSD sums
-            p1 = self.ssd_plot(ssd_sums['Y1 (training func)'], f'SSD for Y1 (training func)-Log Sclae & The Function selected is {lowest_ssd_y1} @Value {ssd_sums_y1[lowest_ssd_y1]}')
-            p2 = self.ssd_plot(ssd_sums['Y2 (training func)'], f'SSD for Y1 (training func)-Log Sclae & The Function selected is {lowest_ssd_y2} @Value {ssd_sums_y2[lowest_ssd_y2]}')
-            p3 = self.ssd_plot(ssd_sums['Y3 (training func)'], f'SSD for Y1 (training func)-Log Sclae & The Function selected is {lowest_ssd_y3} @Value {ssd_sums_y2[lowest_ssd_y3]}')
-            p4 = self.ssd_plot(ssd_sums['Y4 (training func)'], f'SSD for Y1 (training func)-Log Sclae & The Function selected is {lowest_ssd_y4} @Value {ssd_sums_y2[lowest_ssd_y4]}')
-            
-
-           # Combine p1 and p2 in one row, and p3 and p4 in another row
-            top_row = row(p1, p2)
-            middle_row = row(p3, p4)
-
-            # Stack the two rows and the scatter plot vertically
-            layout = column(top_row, middle_row)
+            # Stack the SSD panels vertically
+            layout = column(*self.ssd_panels(heatmap, top_k))
 
             # Show the layout
             show(layout)
             
+        @instrumented('scatter_plot_only', rows=lambda self, *args, **kwargs: len(self.test_results))
         def scatter_plot_only(self):
             """
             Creates and shows a layout consisting only of the scatter plot of test results.
@@ -1,5 +1,12 @@
-from sqlalchemy import create_engine
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import Index, MetaData, Table, inspect, text
+import numpy as np
 import pandas as pd
+
+from db_session import DatabaseSession
+from instrumentation import Instrumentation, instrumented
 class ReadCsv:
     """
     A class for reading CSV files and loading their contents into Microsoft SQL Server  tables. 
@@ -20,18 +27,37 @@ class ReadCsv:
         file_names (list of str): Names of CSV files to be processed.
         tabels (dict): Dictionary mapping table names to their schema (column names and data types).
         file_to_table_map (dict): Dictionary mapping file names to corresponding SQL table names.
+        instrumentation (Instrumentation): Records the time, rows and memory of the loads. Disabled unless one is passed in.
+        load_report (dict): Rows loaded, seconds taken and error message (or None) per file of the last load.
         engine (SQLAlchemy engine, optional): SQLAlchemy engine instance for database connections.
+                                              An engine passed in is used instead of the one from `session`.
+        session (DatabaseSession): The session providing the pooled engine. Built from the settings above unless
+                                   one is passed in, e.g. to share it with `CreateDatabaseTable` or to use SQLite.
 
     Methods:
         alchemy_connection():
-            Establishes a connection to the database using SQLAlchemy.
+            Gets the pooled SQLAlchemy engine for the database from `session`. Repeated calls reuse the same engine.
 
-        read_csv_to_sql():
+        read_csv_to_sql(bulk=False, chunksize=10000, transaction_per_chunk=False, workers=1):
             Reads CSV files, maps their columns to SQL table columns as per `tabels` attribute,
             and inserts the data into the corresponding tables. It dynamically adjusts to the number
-            of columns in each CSV file and the schema of the target SQL table.
+            of columns in each CSV file and the schema of the target SQL table. In bulk mode the data is
+            loaded in chunks into the typed tables defined in `tabels` instead of replacing them. With
+            `workers` > 1 the files are loaded concurrently. Returns the loaded DataFrames.
+
+        columns_to_use(csv_path, table_columns):
+            Returns the table column names to use for a CSV file based on the number of columns in its header.
+
+        read_csv_to_store(store, to_sql=False, bulk=True, chunksize=10000):
+            Loads the CSV files through a memory-mapped columnar store, optionally copying them to SQL as well.
+
+        bulk_load(df, table_name, chunksize=10000, transaction_per_chunk=False):
+            Loads a DataFrame in chunks into a pre-created typed table, replacing its rows, and reports rows/sec.
+
+        write_test_results_incremental(calculations, df_test, table_name='test_results', match='exact', tolerance=None, chunksize=10000):
+            Classifies and appends only the test rows not yet written to the results table, tracked by content hash.
     """
-    def __init__(self, server, database_name, username, password, driver, port, dataset_path,file_names, tabels,file_to_table_map):
+    def __init__(self, server, database_name, username, password, driver, port, dataset_path,file_names, tabels,file_to_table_map, engine=None, session=None, instrumentation=None):
         self.server = server
         self.database_name = database_name
         self.username = username
@@ -42,20 +68,40 @@ class ReadCsv:
         self.dataset_path = dataset_path.replace('\\','/')  #convert the path to unicode to avoid error
         self.file_names = file_names
         self.file_to_table_map = file_to_table_map
-        self.engine = None  # Placeholder for the engine
+        self.engine = engine  # Placeholder for the engine
+        self.session = session or DatabaseSession(server, database_name, username, password, driver, port)
+        self.load_report = {}
+        self.instrumentation = instrumentation or Instrumentation(enabled=False)
 
 
     def alchemy_connection(self):
         ### Insert the data into SQL Server
-        # Your connection string to insert data line by line using sqlalchemy
-        connection_string_alchemy = f'mssql+pyodbc://{self.username}:{self.password}@{self.server}/{self.database_name}?driver={self.driver.replace(" ", "+")}&TrustServerCertificate=yes'
-        self.engine = create_engine(connection_string_alchemy)
+        # The session keeps one pooled engine per server and database, so calling this again reuses it
+        self.engine = self.session.engine()
 
-    def read_csv_to_sql(self):
-        self.alchemy_connection()
+    @instrumented('read_csv_to_sql', rows=lambda self, *args, **kwargs: sum(report['rows'] for report in self.load_report.values()))
+    def read_csv_to_sql(self, bulk=False, chunksize=10000, transaction_per_chunk=False, workers=1):
+        """
+        Reads the CSV files and copies them to their SQL tables. The number of rows, the time taken and any error
+        are recorded per file in `load_report`; a file that fails to load does not stop the others.
+
+        Parameters:
+            bulk (bool): If False, every table is replaced by `to_sql` with default settings. If True, the rows are
+                         deleted from the typed tables defined in `tabels` (created if missing) and the data is inserted
+                         in batched chunks, using the `fast_executemany` setting of the session on SQL Server.
+            chunksize (int): Number of rows inserted per chunk in bulk mode.
+            transaction_per_chunk (bool): In bulk mode, commit every chunk in its own transaction instead of
+                                          loading each table in a single transaction.
+            workers (int): Number of files loaded concurrently in a thread pool, 1 loads them one after another.
+
+        Returns:
+            dict: The loaded DataFrames keyed by the file name without '.csv'.
+        """
+        if self.engine is None:
+            self.alchemy_connection()
         if self.engine is None:
             print("Engine has not been initialized. Call alchemy_connection first.")
-            return
+            return {}
         
         tabels_dic = self.tabels
         
@@ -73,37 +119,210 @@ class ReadCsv:
 
         # Dictionary to store each DataFrame, using a modified file name as the key
         dataframes = {}
+        self.load_report = {}
 
-        for file_name in self.file_names:
-            # Path to the current CSV file
-            csv_path = f'{self.dataset_path}/{file_name}'
-            
-            # Read the first row to determine the number of columns in the CSV
-            with open(csv_path, 'r') as csvfile:
-                first_line = csvfile.readline()
-                num_columns_in_csv = len(first_line.split(','))
-            
-            # Determine the column names to use based on the number of columns in the CSV
-            if num_columns_in_csv <= len(column_names[file_name]):
-                cols_to_use = column_names[file_name][:num_columns_in_csv]
-            else:
-                # If the CSV has more columns than expected, you could handle this case as needed.
-                # For simplicity, this example will still use the defined columns up to the length of `column_names[file_name]`
-                cols_to_use = column_names[file_name]
-            
-            # Now, read the CSV with the dynamically determined columns
-            df = pd.read_csv(csv_path, names=cols_to_use, header=0)
-            table_name = self.file_to_table_map[file_name]
-            # Save the DataFrame to the SQL table
+        def load_file(file_name):
+            start_time = time.perf_counter()
+            try:
+                with self.instrumentation.stage(f'read_csv_to_sql {file_name}') as record:
+                    df = self._load_file(file_name, column_names[file_name], bulk, chunksize, transaction_per_chunk)
+                    record['rows'] = len(df)
+            except Exception as e:
+                self.load_report[file_name] = {'rows': 0, 'seconds': time.perf_counter() - start_time, 'error': str(e)}
+                print(f'Error while loading {file_name}: {e}')
+                return
+            self.load_report[file_name] = {'rows': len(df), 'seconds': time.perf_counter() - start_time, 'error': None}
+            # Removing '.csv' from file_name to use as dictionary key
+            dataframes[file_name.replace('.csv', '')] = df
+
+        if workers > 1:
+            # The files are independent, so parsing and writing overlap; the SQL drivers and the CSV parser release the GIL
+            with ThreadPoolExecutor(max_workers=min(workers, len(self.file_names))) as executor:
+                list(executor.map(load_file, self.file_names))
+        else:
+            for file_name in self.file_names:
+                load_file(file_name)
+
+        # Keep the order of file_names regardless of the order in which the loads finished
+        return {file_name.replace('.csv', ''): dataframes[file_name.replace('.csv', '')]
+                for file_name in self.file_names if file_name.replace('.csv', '') in dataframes}
+
+    def _load_file(self, file_name, table_columns, bulk, chunksize, transaction_per_chunk):
+        """
+        Reads one CSV file, copies it to its SQL table and returns the DataFrame.
+        """
+        # Path to the current CSV file
+        csv_path = f'{self.dataset_path}/{file_name}'
+        
+        cols_to_use = self.columns_to_use(csv_path, table_columns)
+        
+        # Now, read the CSV with the dynamically determined columns
+        df = pd.read_csv(csv_path, names=cols_to_use, header=0)
+        table_name = self.file_to_table_map[file_name]
+        # Save the DataFrame to the SQL table
+        if bulk:
+            start_time = time.perf_counter()
+            self.bulk_load(df, table_name, chunksize, transaction_per_chunk)
+            elapsed = time.perf_counter() - start_time
+            print(f'Data Copied to {table_name} in SQL ({len(df)} rows, {len(df) / max(elapsed, 1e-9):,.0f} rows/sec)')
+        else:
             df.to_sql(name=table_name, con=self.engine, if_exists='replace', index=False)
             print(f'Data Copied to {table_name} in SQL')
-            
-            # Removing '.csv' from file_name to use as dictionary key
-            name_key = file_name.replace('.csv', '')
-            
-            # Storing the DataFrame in the dictionary
-            dataframes[name_key] = df
-           
+        return df
+
+    def columns_to_use(self, csv_path, table_columns):
+        """
+        Returns the table column names to use for a CSV file, based on the number of columns in its header.
+        """
+        # Read the first row to determine the number of columns in the CSV
+        with open(csv_path, 'r') as csvfile:
+            first_line = csvfile.readline()
+            num_columns_in_csv = len(first_line.split(','))
         
+        # Determine the column names to use based on the number of columns in the CSV
+        if num_columns_in_csv <= len(table_columns):
+            return table_columns[:num_columns_in_csv]
+        # If the CSV has more columns than expected, you could handle this case as needed.
+        # For simplicity, this example will still use the defined columns up to the length of `table_columns`
+        return table_columns
+
+    @instrumented('read_csv_to_store')
+    def read_csv_to_store(self, store, to_sql=False, bulk=True, chunksize=10000):
+        """
+        Loads the CSV files through a columnar store, so each file is parsed once and later runs memory-map
+        the stored float64 matrix instead of parsing text or reading the data back from SQL.
+
+        Parameters:
+            store (ColumnarStore): Store holding the binary copies of the CSV files.
+            to_sql (bool): Also copy the data to the SQL tables, which makes SQL an optional sink.
+            bulk (bool): Use `bulk_load` instead of replacing the tables when copying to SQL.
+            chunksize (int): Number of rows inserted per chunk in bulk mode.
+
+        Returns:
+            dict: DataFrames keyed by the file name without '.csv'.
+        """
+        if to_sql and self.engine is None:
+            self.alchemy_connection()
+
+        dataframes = {}
+        for file_name in self.file_names:
+            table_name = self.file_to_table_map[file_name]
+            csv_path = f'{self.dataset_path}/{file_name}'
+            table_columns = [col[0] for col in self.tabels[table_name]]
+            df = store.load_csv(csv_path, self.columns_to_use(csv_path, table_columns), name=table_name)
+
+            if to_sql:
+                if bulk:
+                    self.bulk_load(df, table_name, chunksize)
+                else:
+                    df.to_sql(name=table_name, con=self.engine, if_exists='replace', index=False)
+                print(f'Data Copied to {table_name} in SQL')
+
+            dataframes[file_name.replace('.csv', '')] = df
+        return dataframes
+
+    def bulk_load(self, df, table_name, chunksize=10000, transaction_per_chunk=False):
+        """
+        Loads a DataFrame into the pre-created typed table `table_name`, replacing its rows.
+        The table is created from its definition in `tabels` if it does not exist yet.
+
+        Parameters:
+            df (DataFrame): Data to load, its columns must be columns of the table.
+            table_name (str): Name of the SQL table.
+            chunksize (int): Number of rows inserted per chunk.
+            transaction_per_chunk (bool): Commit every chunk in its own transaction instead of one transaction per table.
+        """
+        if not inspect(self.engine).has_table(table_name):
+            col_definitions = [f"[{col_name}] {data_type}" for col_name, data_type in self.tabels[table_name]]
+            with self.engine.begin() as conn:
+                conn.execute(text(f"CREATE TABLE {table_name} ({', '.join(col_definitions)})"))
+
+        # Each chunk is sent as one DB-API executemany batch, which pyodbc sends in a single round trip
+        # when the engine was created with fast_executemany
+        chunks = [df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize)]
+        if transaction_per_chunk:
+            with self.engine.begin() as conn:
+                conn.execute(text(f"DELETE FROM {table_name}"))
+            for chunk in chunks:
+                with self.engine.begin() as conn:
+                    chunk.to_sql(name=table_name, con=conn, if_exists='append', index=False)
+        else:
+            with self.engine.begin() as conn:
+                conn.execute(text(f"DELETE FROM {table_name}"))
+                for chunk in chunks:
+                    chunk.to_sql(name=table_name, con=conn, if_exists='append', index=False)
+
+    @staticmethod
+    def _row_hashes(df_test):
+        """
+        Returns a 64-bit content hash of the X and Y value of every test row, as signed integers for SQL BIGINT.
+        """
+        values = df_test[['X (test func)', 'Y (test func)']].astype('float64')
+        return pd.util.hash_pandas_object(values, index=False).to_numpy().view(np.int64)
+
+    @instrumented('write_test_results_incremental', rows=lambda self, calculations, df_test, *args, **kwargs: len(df_test))
+    def write_test_results_incremental(self, calculations, df_test, table_name='test_results', match='exact', tolerance=None, chunksize=10000):
+        """
+        Classifies only the test rows that are not yet in `table_name` and appends them, instead of replacing
+        the whole table. Rows already written are tracked by a content hash of their X and Y values in the
+        table `<table_name>_watermark`, which is built from the existing rows on first use. The hashes of
+        `df_test` are loaded into the table `<table_name>_staging` and compared with the watermark in the
+        database, so the cost does not grow with the number of rows already written. An index on
+        'X (test func)' is created on `table_name` if it does not exist.
+
+        Parameters:
+            calculations (Calculations): Calculations with the top ideal functions and adjusted deviations computed.
+            df_test (DataFrame): Test data with the columns 'X (test func)' and 'Y (test func)'.
+            table_name (str): Name of the SQL table holding the test results.
+            match (str): How test X values are looked up in the ideal data, see `Calculations.match_points`.
+            tolerance (float, optional): Largest allowed distance to the closest ideal X, see `Calculations.match_points`.
+            chunksize (int): Number of rows inserted per batch.
+
+        Returns:
+            int: Number of rows appended.
+        """
+        if self.engine is None:
+            self.alchemy_connection()
+        watermark_table = f'{table_name}_watermark'
+        staging_table = f'{table_name}_staging'
+
+        inspector = inspect(self.engine)
+        if not inspector.has_table(watermark_table):
+            with self.engine.begin() as conn:
+                conn.execute(text(f"CREATE TABLE {watermark_table} (row_hash BIGINT NOT NULL PRIMARY KEY)"))
+                if inspector.has_table(table_name):
+                    # Results written by earlier full replaces: seed the watermark so they are not appended again
+                    df_existing = pd.read_sql_query(f"SELECT [X (test func)], [Y (test func)] FROM {table_name}", conn)
+                    existing_hashes = np.unique(self._row_hashes(df_existing))
+                    pd.DataFrame({'row_hash': existing_hashes}).to_sql(name=watermark_table, con=conn, if_exists='append', index=False, chunksize=chunksize)
+
+        # Deduplicate the batch locally, then find the rows missing from the watermark in the database so the
+        # written hashes never have to be downloaded
+        row_hashes = self._row_hashes(df_test)
+        first_rows = np.flatnonzero(~pd.Series(row_hashes).duplicated().to_numpy())
+        df_staging = pd.DataFrame({'row_hash': row_hashes[first_rows], 'row_position': first_rows})
+        new_hashes_query = (f"FROM {staging_table} s WHERE NOT EXISTS "
+                            f"(SELECT 1 FROM {watermark_table} w WHERE w.row_hash = s.row_hash)")
+
+        with self.engine.begin() as conn:
+            if inspect(conn).has_table(staging_table):
+                conn.execute(text(f"DROP TABLE {staging_table}"))
+            conn.execute(text(f"CREATE TABLE {staging_table} (row_hash BIGINT NOT NULL, row_position BIGINT NOT NULL)"))
+            df_staging.to_sql(name=staging_table, con=conn, if_exists='append', index=False, chunksize=chunksize)
+            new_rows = np.sort(pd.read_sql_query(f"SELECT s.row_position {new_hashes_query}", conn)['row_position'].to_numpy(dtype=np.int64))
+
+            if len(new_rows):
+                df_new_results = calculations.classify(df_test.iloc[new_rows], match, tolerance).sort_values(by='X (test func)')
+                df_new_results.to_sql(name=table_name, con=conn, if_exists='append', index=False, chunksize=chunksize)
+                conn.execute(text(f"INSERT INTO {watermark_table} (row_hash) SELECT s.row_hash {new_hashes_query}"))
+                results_table = Table(table_name, MetaData(), autoload_with=conn)
+                Index(f'ix_{table_name}_x', results_table.c['X (test func)']).create(conn, checkfirst=True)
+            conn.execute(text(f"DROP TABLE {staging_table}"))
+
+        if not len(new_rows):
+            print(f'No new rows for {table_name} in SQL')
+            return 0
 
+        print(f'{len(df_new_results)} new rows appended to {table_name} in SQL')
+        return len(df_new_results)
 